@@ -0,0 +1,171 @@
+import atexit
+import csv
+import datetime
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import registry
+
+ROWS_WRITTEN = registry.counter('attendance_log_rows_total', 'Recognition rows written to the log')
+WRITE_SECONDS = registry.histogram('attendance_log_write_seconds',
+                                   'Time to write one batch to the CSV log (and the attendance store)')
+LOG_FIELDS = ['timestamp', 'person_id', 'person_name', 'confidence', 'location']
+
+
+class LogWriter:
+    """Append recognition rows to a CSV log from a background thread.
+
+    `write()` only enqueues the row, so it never blocks the frame loop and
+    any number of threads may call it. The writer thread keeps the file
+    open and writes rows in batches, flushing once `batch_size` rows are
+    waiting or the oldest waiting row is `flush_interval` seconds old.
+    `flush()` waits until everything written so far is on disk and
+    `close()` flushes and stops the thread.
+
+    With `db_path` every batch is also inserted into an AttendanceStore
+    (see attendance_store.py) in a single transaction. If the store cannot
+    be opened or written, rows still go to the CSV.
+    """
+
+    def __init__(self, csv_path='recognition_log.csv', batch_size=64, flush_interval=1.0, db_path=None):
+        self.csv_path = str(csv_path)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.rows_written = 0
+        self.batches_written = 0
+        self._thread = threading.Thread(target=self._loop, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, person_id, person_name, confidence, location="Unknown", timestamp=None):
+        """Queue one recognition; the timestamp is taken now, not when the row is flushed"""
+        if timestamp is None:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.queue.put({
+            'timestamp': timestamp,
+            'person_id': person_id,
+            'person_name': person_name,
+            'confidence': confidence,
+            'location': location
+        })
+
+    def flush(self, timeout=10):
+        """Wait until every row queued before this call has been written.
+
+        Returns False if that took longer than `timeout` seconds or the
+        writer thread is no longer running.
+        """
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self.queue.put(done)
+        deadline = time.monotonic() + timeout
+        while not done.wait(0.1):
+            if not self._thread.is_alive() or time.monotonic() >= deadline:
+                return False
+        return True
+
+    def close(self, timeout=5):
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout)
+
+    def _open(self):
+        new_file = not os.path.isfile(self.csv_path) or os.path.getsize(self.csv_path) == 0
+        f = open(self.csv_path, 'a', newline='')
+        writer = csv.DictWriter(f, fieldnames=LOG_FIELDS)
+        if new_file:
+            writer.writeheader()
+        return f, writer
+
+    def _open_store(self):
+        if not self.db_path:
+            return None
+        from attendance_store import AttendanceStore
+        try:
+            return AttendanceStore(self.db_path)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Warning: could not open attendance store {self.db_path}, logging to CSV only: {e}")
+            return None
+
+    def _loop(self):
+        f, writer = self._open()
+        # SQLite connections belong to the thread that opened them
+        store = self._open_store()
+        batch, waiters, deadline = [], [], None
+        running = True
+        while running:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False  # flush interval elapsed
+
+            if item is None:
+                running = False
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not False:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            if batch:
+                start = time.perf_counter()
+                try:
+                    writer.writerows(batch)
+                    f.flush()
+                except OSError as e:
+                    print(f"Warning: could not write {len(batch)} rows to {self.csv_path}: {e}")
+                if store is not None:
+                    try:
+                        store.add_many(batch)
+                    except sqlite3.Error as e:
+                        # The CSV stays complete; the store can be refilled with import_csv
+                        print(f"Warning: could not write {len(batch)} rows to {self.db_path}: {e}")
+                WRITE_SECONDS.observe(time.perf_counter() - start)
+                ROWS_WRITTEN.inc(len(batch))
+                self.rows_written += len(batch)
+                self.batches_written += 1
+                batch = []
+            deadline = None
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+        f.close()
+        if store is not None:
+            store.close()
+
+
+# One writer per log file, shared by every stream of the process, so rows are never interleaved
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(csv_path='recognition_log.csv', db_path=None):
+    """The writer of csv_path; raises ValueError if it already stores to a different db_path"""
+    key = os.path.abspath(str(csv_path))
+    db_path = os.path.abspath(str(db_path)) if db_path else None
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = LogWriter(csv_path, db_path=db_path)
+        elif writer.db_path != db_path:
+            raise ValueError(f"Log {csv_path} is already written with attendance store {writer.db_path}")
+        return writer
+
+
+@atexit.register
+def close_all():
+    """Flush and close every log writer (also runs automatically at interpreter exit)"""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
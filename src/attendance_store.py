@@ -0,0 +1,332 @@
+import csv
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id          INTEGER PRIMARY KEY,
+    timestamp   TEXT NOT NULL,  -- 'YYYY-MM-DD HH:MM:SS', sorts chronologically
+    person_id   TEXT NOT NULL,
+    person_name TEXT,
+    confidence  REAL,
+    location    TEXT NOT NULL DEFAULT 'Unknown'
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_person_time ON attendance (person_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_attendance_location_time ON attendance (location, timestamp);
+CREATE INDEX IF NOT EXISTS idx_attendance_time ON attendance (timestamp);
+-- The same sighting is stored once, so re-importing a CSV log is harmless
+CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_event ON attendance (timestamp, person_id, location);
+"""
+
+# Rollups kept up to date by a trigger on every inserted event, so dashboard
+# totals are read from a handful of small rows instead of scanning events
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_person (
+    day TEXT NOT NULL, person_id TEXT NOT NULL, events INTEGER NOT NULL,
+    first_seen TEXT, last_seen TEXT,
+    PRIMARY KEY (day, person_id)
+);
+CREATE TABLE IF NOT EXISTS daily_person_location (
+    day TEXT NOT NULL, location TEXT NOT NULL, person_id TEXT NOT NULL, events INTEGER NOT NULL,
+    PRIMARY KEY (day, location, person_id)
+);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT PRIMARY KEY, events INTEGER NOT NULL, students INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_location (
+    day TEXT NOT NULL, location TEXT NOT NULL, events INTEGER NOT NULL, students INTEGER NOT NULL,
+    PRIMARY KEY (day, location)
+);
+CREATE TABLE IF NOT EXISTS person_totals (
+    person_id TEXT PRIMARY KEY, person_name TEXT, events INTEGER NOT NULL, days_present INTEGER NOT NULL,
+    first_seen TEXT, last_seen TEXT
+);
+CREATE TABLE IF NOT EXISTS location_totals (
+    location TEXT PRIMARY KEY, events INTEGER NOT NULL, last_seen TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS attendance_rollup AFTER INSERT ON attendance
+BEGIN
+    INSERT INTO person_totals VALUES (NEW.person_id, NEW.person_name, 0, 0, NEW.timestamp, NEW.timestamp)
+        ON CONFLICT (person_id) DO NOTHING;
+    UPDATE person_totals SET
+        events = events + 1,
+        days_present = days_present + NOT EXISTS (SELECT 1 FROM daily_person
+            WHERE day = substr(NEW.timestamp, 1, 10) AND person_id = NEW.person_id),
+        person_name = coalesce(NEW.person_name, person_name),
+        first_seen = min(first_seen, NEW.timestamp),
+        last_seen = max(last_seen, NEW.timestamp)
+    WHERE person_id = NEW.person_id;
+
+    INSERT INTO daily_totals VALUES (substr(NEW.timestamp, 1, 10), 0, 0) ON CONFLICT (day) DO NOTHING;
+    UPDATE daily_totals SET
+        events = events + 1,
+        students = students + NOT EXISTS (SELECT 1 FROM daily_person
+            WHERE day = substr(NEW.timestamp, 1, 10) AND person_id = NEW.person_id)
+    WHERE day = substr(NEW.timestamp, 1, 10);
+
+    INSERT INTO daily_location VALUES (substr(NEW.timestamp, 1, 10), NEW.location, 0, 0)
+        ON CONFLICT (day, location) DO NOTHING;
+    UPDATE daily_location SET
+        events = events + 1,
+        students = students + NOT EXISTS (SELECT 1 FROM daily_person_location
+            WHERE day = substr(NEW.timestamp, 1, 10) AND location = NEW.location AND person_id = NEW.person_id)
+    WHERE day = substr(NEW.timestamp, 1, 10) AND location = NEW.location;
+
+    INSERT INTO location_totals VALUES (NEW.location, 1, NEW.timestamp)
+        ON CONFLICT (location) DO UPDATE SET events = events + 1, last_seen = max(last_seen, excluded.last_seen);
+
+    -- Last, because the NOT EXISTS checks above look for these rows
+    INSERT INTO daily_person VALUES (substr(NEW.timestamp, 1, 10), NEW.person_id, 1, NEW.timestamp, NEW.timestamp)
+        ON CONFLICT (day, person_id) DO UPDATE SET events = events + 1,
+            first_seen = min(first_seen, excluded.first_seen), last_seen = max(last_seen, excluded.last_seen);
+    INSERT INTO daily_person_location VALUES (substr(NEW.timestamp, 1, 10), NEW.location, NEW.person_id, 1)
+        ON CONFLICT (day, location, person_id) DO UPDATE SET events = events + 1;
+END;
+"""
+
+ROLLUP_TABLES = ('daily_person', 'daily_person_location', 'daily_totals', 'daily_location',
+                 'person_totals', 'location_totals')
+
+# Recomputes every rollup from the events; run statement by statement by
+# rebuild_rollups() so the DELETEs and INSERTs share one transaction
+ROLLUP_REBUILD = (
+    """INSERT INTO daily_person
+       SELECT substr(timestamp, 1, 10), person_id, COUNT(*), MIN(timestamp), MAX(timestamp)
+       FROM attendance GROUP BY 1, 2""",
+    """INSERT INTO daily_person_location
+       SELECT substr(timestamp, 1, 10), location, person_id, COUNT(*)
+       FROM attendance GROUP BY 1, 2, 3""",
+    """INSERT INTO daily_totals
+       SELECT day, SUM(events), COUNT(*) FROM daily_person GROUP BY day""",
+    """INSERT INTO daily_location
+       SELECT day, location, SUM(events), COUNT(*) FROM daily_person_location GROUP BY day, location""",
+    """INSERT INTO person_totals
+       SELECT p.person_id,
+              (SELECT person_name FROM attendance a WHERE a.person_id = p.person_id
+               ORDER BY timestamp DESC LIMIT 1),
+              SUM(events), COUNT(*), MIN(first_seen), MAX(last_seen)
+       FROM daily_person p GROUP BY p.person_id""",
+    """INSERT INTO location_totals
+       SELECT location, COUNT(*), MAX(timestamp) FROM attendance GROUP BY location""",
+)
+
+COLUMNS = ('timestamp', 'person_id', 'person_name', 'confidence', 'location')
+
+
+class AttendanceStore:
+    """Recognition events in an indexed SQLite database.
+
+    The database runs in WAL mode, so the dashboard can read while
+    recognition writes. Every thread gets its own connection.
+
+    Per-day, per-student and per-location rollups are maintained by a
+    trigger as events are inserted (see ROLLUP_SCHEMA); `stats()` reads
+    them and `rebuild_rollups()` recomputes them from all events.
+    """
+
+    def __init__(self, db_path='attendance.db'):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            conn.executescript(ROLLUP_SCHEMA)
+        if self.last_id() and not self.connection().execute("SELECT 1 FROM daily_totals LIMIT 1").fetchone():
+            # Events stored before the rollups existed
+            self.rebuild_rollups()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add_many(self, rows):
+        """Insert dicts with the CSV log's columns in one transaction; returns rows added"""
+        params = [(str(row['timestamp']), str(row['person_id']), row.get('person_name'),
+                   float(row['confidence']) if row.get('confidence') not in (None, '') else None,
+                   row.get('location') or 'Unknown')
+                  for row in rows]
+        conn = self.connection()
+        with conn:
+            # rowcount counts inserted events only, not the rollup rows the trigger touches
+            return conn.executemany("INSERT OR IGNORE INTO attendance "
+                                    "(timestamp, person_id, person_name, confidence, location) "
+                                    "VALUES (?, ?, ?, ?, ?)", params).rowcount
+
+    def add(self, timestamp, person_id, person_name, confidence, location="Unknown"):
+        return self.add_many([{'timestamp': timestamp, 'person_id': person_id, 'person_name': person_name,
+                               'confidence': confidence, 'location': location}])
+
+    @staticmethod
+    def _where(person_id=None, location=None, start=None, end=None, min_confidence=None):
+        """SQL conditions for the common filters; start/end are dates or timestamps, end exclusive"""
+        clauses, params = [], []
+        if person_id is not None:
+            clauses.append("person_id = ?")
+            params.append(str(person_id))
+        if location is not None:
+            clauses.append("location = ?")
+            params.append(location)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(str(start))
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(str(end))
+        if min_confidence is not None:
+            clauses.append("confidence >= ?")
+            params.append(float(min_confidence))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def iter_query(self, person_id=None, location=None, start=None, end=None, min_confidence=None,
+                   limit=None, descending=False, after=None):
+        """Yield matching events as dicts, ordered by (timestamp, id), without loading them all.
+
+        `after` is the (timestamp, id) of the last event already seen, for
+        keyset pagination that stays fast however deep the page is.
+        """
+        where, params = self._where(person_id, location, start, end, min_confidence)
+        if after is not None:
+            op = '<' if descending else '>'
+            where += (" AND " if where else " WHERE ") + f"(timestamp {op} ? OR (timestamp = ? AND id {op} ?))"
+            params += [after[0], after[0], int(after[1])]
+        order = 'DESC' if descending else 'ASC'
+        sql = f"SELECT id, {', '.join(COLUMNS)} FROM attendance{where} ORDER BY timestamp {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        for row in self.connection().execute(sql, params):
+            yield dict(row)
+
+    def query(self, *args, **kwargs):
+        """Matching events as a list of dicts (see iter_query)"""
+        return list(self.iter_query(*args, **kwargs))
+
+    def last_id(self):
+        """Highest event id; changes whenever an event is added"""
+        return self.connection().execute("SELECT MAX(id) FROM attendance").fetchone()[0] or 0
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self.connection().execute(f"SELECT COUNT(*) FROM attendance{where}", params).fetchone()[0]
+
+    def import_csv(self, csv_path='recognition_log.csv', batch_size=5000):
+        """Import an existing recognition_log.csv; rows already in the store are skipped"""
+        start = time.perf_counter()
+        read, added, batch = 0, 0, []
+        with open(csv_path, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                if not row.get('timestamp') or not row.get('person_id'):
+                    continue  # blank or truncated line
+                batch.append(row)
+                read += 1
+                if len(batch) >= batch_size:
+                    added += self.add_many(batch)
+                    batch = []
+        if batch:
+            added += self.add_many(batch)
+        print(f"Imported {added} of {read} rows from {csv_path} into {self.db_path} "
+              f"in {time.perf_counter() - start:.2f}s")
+        return added
+
+    def rebuild_rollups(self):
+        """Recompute every rollup from the stored events (backfill)"""
+        start = time.perf_counter()
+        conn = self.connection()
+        # One transaction: readers see either the old or the new rollups, never
+        # empty tables, and a failure rolls the DELETEs back too
+        with conn:
+            for table in ROLLUP_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+            for statement in ROLLUP_REBUILD:
+                conn.execute(statement)
+        print(f"Rebuilt attendance rollups in {time.perf_counter() - start:.2f}s")
+
+    def stats(self, day=None):
+        """Dashboard totals for `day` (default today) and per-student attendance, read from the rollups"""
+        import datetime
+        day = day or datetime.date.today().isoformat()
+        conn = self.connection()
+        days = conn.execute("SELECT COUNT(*) FROM daily_totals").fetchone()[0]
+        today = conn.execute("SELECT events, students FROM daily_totals WHERE day = ?", (day,)).fetchone()
+        return {
+            'day': day,
+            'totals': {
+                'students': conn.execute("SELECT COUNT(*) FROM person_totals").fetchone()[0],
+                'locations': conn.execute("SELECT COUNT(*) FROM location_totals").fetchone()[0],
+                'days': days,
+                'events': conn.execute("SELECT COALESCE(SUM(events), 0) FROM location_totals").fetchone()[0],
+            },
+            'today': {
+                'events': today['events'] if today else 0,
+                'present': today['students'] if today else 0,
+                'byLocation': [dict(row) for row in conn.execute(
+                    "SELECT location, events, students FROM daily_location WHERE day = ? ORDER BY location",
+                    (day,))],
+            },
+            'locations': [dict(row) for row in conn.execute(
+                "SELECT location, events, last_seen AS lastSeen FROM location_totals ORDER BY location")],
+            'students': [{
+                'personId': row['person_id'],
+                'personName': row['person_name'],
+                'events': row['events'],
+                'daysPresent': row['days_present'],
+                'attendanceRate': round(row['days_present'] / days, 4) if days else 0.0,
+                'lastSeen': row['last_seen'],
+            } for row in conn.execute("SELECT * FROM person_totals ORDER BY person_id")],
+        }
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Attendance store (SQLite)')
+    parser.add_argument('--db', dest='db_path', default='attendance.db',
+                        help='Database path (default: attendance.db)')
+    parser.add_argument('--import-csv', dest='import_csv',
+                        help='Import an existing recognition log CSV')
+    parser.add_argument('--person-id', help='Show events of this person')
+    parser.add_argument('--location', help='Show events at this location')
+    parser.add_argument('--date', help='Show events of this day (YYYY-MM-DD)')
+    parser.add_argument('--limit', type=int, default=50, help='Rows to show (default: 50)')
+    parser.add_argument('--rebuild-stats', dest='rebuild_stats', action='store_true',
+                        help='Recompute the daily/student/location rollups from all events')
+    args = parser.parse_args()
+
+    store = AttendanceStore(args.db_path)
+    if args.import_csv:
+        store.import_csv(args.import_csv)
+        return
+    if args.rebuild_stats:
+        store.rebuild_rollups()
+        return
+
+    start = end = None
+    if args.date:
+        import datetime
+        day = datetime.date.fromisoformat(args.date)
+        start, end = day.isoformat(), (day + datetime.timedelta(days=1)).isoformat()
+    query_start = time.perf_counter()
+    rows = store.query(args.person_id, args.location, start, end, limit=args.limit)
+    elapsed_ms = 1000 * (time.perf_counter() - query_start)
+    for row in rows:
+        # Both columns are nullable, e.g. for rows imported from older CSV logs
+        confidence = f"{row['confidence']:.2f}" if row['confidence'] is not None else '   -'
+        print(f"{row['timestamp']}  {row['person_id']:>4}  {row['person_name'] or '':<20} "
+              f"{confidence}  {row['location']}")
+    print(f"{len(rows)} rows in {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
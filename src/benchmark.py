@@ -0,0 +1,345 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import dataset_store
+
+# Bump when metric names or units change so old result files are not compared blindly
+RESULTS_VERSION = 1
+SUITES = ['dataset', 'train', 'inference', 'e2e']
+
+
+def timing_stats(samples):
+    """Mean / median / p95 of a list of durations in seconds, as milliseconds"""
+    samples = np.asarray(samples) * 1000.0
+    return {
+        'mean_ms': round(float(samples.mean()), 3),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+    }
+
+
+def metric(value, unit, better='lower', **details):
+    return {'value': round(float(value), 4), 'unit': unit, 'better': better, **details}
+
+
+def environment():
+    """Versions and hardware the numbers were measured on"""
+    env = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+    try:
+        env['git_commit'] = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                           cwd=Path(__file__).parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        env['git_commit'] = None
+    return env
+
+
+def make_roster(data_dir, out_dir, scale=1, seed=0):
+    """Copy face_data/person*/ to out_dir and add (scale - 1) synthetic people per real one.
+
+    A synthetic person is a real person's images with a fixed brightness
+    offset and seeded noise, so every file is distinct while the roster is
+    the same on every run. Returns (people, images).
+    """
+    rng = np.random.default_rng(seed)
+    people = dataset_store.scan_face_data(data_dir)
+    next_id = max(people, default=0) + 1
+    out_dir = Path(out_dir)
+    images = 0
+    for person_id, (person_dir, paths) in people.items():
+        shutil.copytree(person_dir, out_dir / f"person{person_id}")
+        images += len(paths)
+        for copy in range(1, scale):
+            target = out_dir / f"person{next_id}"
+            target.mkdir(parents=True)
+            offset = 12 * (copy % 5) - 24
+            for path in paths:
+                face = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                noise = rng.normal(0, 4, face.shape)
+                face = np.clip(face.astype(np.float32) + offset + noise, 0, 255).astype(np.uint8)
+                cv2.imwrite(str(target / Path(path).name), face)
+            images += len(paths)
+            next_id += 1
+    return len(people) * scale, images
+
+
+def make_replay(data_dir, out_dir, frames_per_person=20, frame_size=(640, 480)):
+    """Write camera-sized frames with one enlarged face each, as face_data-style person<id>/ folders"""
+    width, height = frame_size
+    frames = 0
+    for person_id, (_, paths) in dataset_store.scan_face_data(data_dir).items():
+        target = Path(out_dir) / f"person{person_id}"
+        target.mkdir(parents=True, exist_ok=True)
+        for i, path in enumerate(paths[:frames_per_person]):
+            face = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            face = cv2.resize(face, (face.shape[1] * 2, face.shape[0] * 2))
+            frame = np.full((height, width), 110, dtype=np.uint8)
+            y, x = (height - face.shape[0]) // 2, (width - face.shape[1]) // 2
+            frame[y:y + face.shape[0], x:x + face.shape[1]] = face
+            cv2.imwrite(str(target / f"frame{i:04d}.jpg"), cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+            frames += 1
+    return frames
+
+
+def bench_dataset_build(data_dir, names_path, work_dir, scales, seed, workers=None):
+    """Cold (empty cache) and warm (cached) dataset builds for each roster size"""
+    results = {}
+    for scale in scales:
+        roster = Path(work_dir) / f"roster_x{scale}"
+        people, images = make_roster(data_dir, roster, scale, seed)
+        names = roster / "person_names.json"
+        if os.path.exists(names_path):
+            shutil.copy(names_path, names)
+        cache = roster / "face_cache.npz"
+        dataset = roster / "face_dataset.npz"
+
+        for mode in ('cold', 'warm'):
+            if mode == 'cold' and cache.exists():
+                cache.unlink()
+            np.random.seed(seed)
+            start = time.perf_counter()
+            dataset_store.create_npz_dataset(roster, names_path=str(names), dataset_path=str(dataset),
+                                             cache_path=str(cache), workers=workers)
+            elapsed = time.perf_counter() - start
+            results[f"dataset_build.{mode}.x{scale}"] = metric(
+                elapsed, 's', people=people, images=images, images_per_s=round(images / elapsed, 1))
+    return results
+
+
+def bench_training(dataset_path, batch_size=32, steps=20, warmup=3, seed=0, input_pipeline='sequence',
+                   precision='float32', model_out=None):
+    """Steps/second of train_on_batch over the training input pipeline; returns (results, model)"""
+    import tensorflow as tf
+    from training import build_inputs, create_model
+
+    tf.keras.utils.set_random_seed(seed)
+    inputs = build_inputs(dataset_path, batch_size, input_pipeline=input_pipeline)
+    if inputs is None:
+        return {}, None
+    train_data, _, _, num_classes, train_count = inputs
+    model = create_model(num_classes, precision=precision)
+
+    if hasattr(train_data, '__getitem__'):
+        batches = (train_data[i % len(train_data)] for i in range(steps + warmup))
+    else:
+        batches = iter(train_data.repeat())
+
+    step_times = []
+    for i in range(steps + warmup):
+        start = time.perf_counter()
+        x, y = next(batches)
+        model.train_on_batch(x, y)
+        if i >= warmup:
+            step_times.append(time.perf_counter() - start)
+
+    if model_out:
+        model.save(model_out)
+    total = sum(step_times)
+    results = {
+        'train.steps_per_s': metric(len(step_times) / total, 'steps/s', 'higher', batch_size=batch_size,
+                                    input_pipeline=input_pipeline, precision=precision,
+                                    train_samples=train_count, **timing_stats(step_times)),
+        'train.samples_per_s': metric(len(step_times) * batch_size / total, 'samples/s', 'higher'),
+    }
+    return results, model
+
+
+def bench_inference(model_path, data_dir, batch_sizes=(1, 8, 32), repeats=30, warmup=3):
+    """Latency of one predict() call for 1 face and for batches of faces"""
+    from inference import load_predictor
+
+    predictor = load_predictor(model_path)
+    _, paths = next(iter(dataset_store.scan_face_data(data_dir).values()))
+    face = cv2.imread(paths[0], cv2.IMREAD_GRAYSCALE)
+    gray = np.full((480, 640), 110, dtype=np.uint8)
+    gray[:face.shape[0], :face.shape[1]] = face
+    box = (0, 0, face.shape[1], face.shape[0])
+
+    results = {}
+    for n in batch_sizes:
+        faces = [box] * n
+        for _ in range(warmup):
+            predictor.predict(gray, faces)
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predictor.predict(gray, faces)
+            samples.append(time.perf_counter() - start)
+        stats = timing_stats(samples)
+        name = 'inference.single_face_ms' if n == 1 else f"inference.batch{n}_ms"
+        results[name] = metric(stats['p50_ms'], 'ms', faces=n,
+                               faces_per_s=round(1000.0 * n / stats['p50_ms'], 1), **stats)
+    predictor.report()
+    return results
+
+
+def bench_end_to_end(model_path, replay_dir, names_path, dataset_path, work_dir, max_frames=None,
+                     detect_scale=1.0, detect_interval=1, track_votes=0):
+    """Recognition FPS on a replayed image sequence, headless, through the full pipeline"""
+    from recognizing import start_recognition
+
+    summary = start_recognition(model_path, names_path=names_path,
+                                csv_path=str(Path(work_dir) / "bench_log.csv"),
+                                location="Benchmark", source=str(replay_dir), headless=True,
+                                max_frames=max_frames, dataset_path=dataset_path,
+                                detect_scale=detect_scale, detect_interval=detect_interval,
+                                track_votes=track_votes, db_path=None)
+    if not summary:
+        return {}
+    return {
+        'e2e.fps': metric(summary['fps'], 'frames/s', 'higher', frames=summary['frames'],
+                          faces=summary['faces'], classified=summary['classified'],
+                          accuracy=summary['accuracy'], detect_scale=detect_scale,
+                          detect_interval=detect_interval, track_votes=track_votes),
+    }
+
+
+def compare_results(baseline, current, tolerance=0.15):
+    """Print current vs baseline for every shared metric; returns the names that regressed"""
+    if baseline.get('version') != current.get('version'):
+        print(f"Warning: baseline has results version {baseline.get('version')}, "
+              f"current is {current.get('version')}")
+    regressions = []
+    print(f"\n{'metric':32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None or not base['value']:
+            continue
+        change = (result['value'] - base['value']) / base['value']
+        worse = change > tolerance if result['better'] == 'lower' else change < -tolerance
+        if worse:
+            regressions.append(name)
+        print(f"{name:32} {base['value']:>12.3f} {result['value']:>12.3f} {100 * change:>+7.1f}%"
+              f"{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def run_benchmarks(data_dir='face_data', names_path='person_names.json', model_path=None, suites=SUITES,
+                   roster_scales=(1, 4), train_steps=20, batch_size=32, batch_sizes=(1, 8, 32), repeats=30,
+                   replay_frames=20, seed=0, workers=None, work_dir=None):
+    """Run the selected suites on copies of the face data; returns the results document.
+
+    Everything is written to a temporary work directory, so the real
+    face_data, person_names.json, dataset and logs are never touched.
+    Without `model_path` the inference and end-to-end suites use the model
+    from the training suite (or an untrained one): latency and FPS do not
+    depend on the weights.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    cleanup = work_dir is None
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix="face_bench_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    results = {}
+
+    try:
+        # The other suites train and recognise on the x1 roster, so it is always built
+        scales = sorted(set(roster_scales) | {1}) if 'dataset' in suites else [1]
+        build_results = bench_dataset_build(data_dir, names_path, work_dir, scales, seed, workers)
+        if 'dataset' in suites:
+            results.update(build_results)
+        roster = work_dir / "roster_x1"
+        dataset_path = str(roster / "face_dataset.npz")
+        names = str(roster / dataset_store.LABEL_NAMES_FILE)
+
+        if model_path is None and {'train', 'inference', 'e2e'} & set(suites):
+            model_path = str(work_dir / "bench_model.keras")
+            steps = train_steps if 'train' in suites else 1
+            train_results, _ = bench_training(dataset_path, batch_size, steps, seed=seed, model_out=model_path)
+            if 'train' in suites:
+                results.update(train_results)
+        elif 'train' in suites:
+            results.update(bench_training(dataset_path, batch_size, train_steps, seed=seed)[0])
+
+        if 'inference' in suites:
+            results.update(bench_inference(model_path, roster, batch_sizes, repeats))
+
+        if 'e2e' in suites:
+            replay = work_dir / "replay"
+            frames = make_replay(roster, replay, replay_frames)
+            results.update(bench_end_to_end(model_path, replay, names, dataset_path, work_dir, frames))
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'config': {
+            'suites': list(suites), 'roster_scales': list(roster_scales), 'train_steps': train_steps,
+            'batch_size': batch_size, 'batch_sizes': list(batch_sizes), 'repeats': repeats,
+            'replay_frames': replay_frames, 'seed': seed, 'model': model_path if not cleanup else None,
+        },
+        'seconds': round(time.perf_counter() - started, 2),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dataset build, training, inference and recognition')
+    parser.add_argument('--data-dir', default='face_data', help='Face images to benchmark on (default: face_data)')
+    parser.add_argument('--names', default='person_names.json', help='Person names file (default: person_names.json)')
+    parser.add_argument('--model', help='Model (.h5/.keras/.tflite) for the inference and e2e suites '
+                                        '(default: the model trained by the benchmark)')
+    parser.add_argument('--suite', nargs='+', choices=SUITES, default=SUITES,
+                        help='Suites to run (default: all)')
+    parser.add_argument('--roster-scales', default='1,4',
+                        help='Comma-separated roster multipliers for the dataset build (default: 1,4)')
+    parser.add_argument('--train-steps', type=int, default=20, help='Timed training steps (default: 20)')
+    parser.add_argument('--batch-size', type=int, default=32, help='Training batch size (default: 32)')
+    parser.add_argument('--batch-sizes', default='1,8,32',
+                        help='Comma-separated faces per inference call (default: 1,8,32)')
+    parser.add_argument('--repeats', type=int, default=30, help='Timed inference calls per batch size (default: 30)')
+    parser.add_argument('--replay-frames', type=int, default=20,
+                        help='Replayed frames per person for the e2e suite (default: 20)')
+    parser.add_argument('--workers', type=int, help='Image decoding workers for the dataset build')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='Where to write the JSON results (default: benchmark_results.json)')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Relative slowdown reported as a regression (default: 0.15)')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.data_dir, args.names, args.model, args.suite,
+                            [int(s) for s in args.roster_scales.split(',')], args.train_steps, args.batch_size,
+                            [int(s) for s in args.batch_sizes.split(',')], args.repeats, args.replay_frames,
+                            args.seed, args.workers)
+
+    print("\n===== Benchmark Results =====")
+    for name, result in report['results'].items():
+        print(f"[BENCH] {name:32} {result['value']:>10.3f} {result['unit']}")
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(json.load(f), report, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import cv2
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Label index -> name map for recognition, written next to person_names.json by create_npz_dataset
+LABEL_NAMES_FILE = 'label_names.json'
+
+# Near-duplicates are at most this many of the 64 perceptual hash bits apart.
+# Deduplication is opt-in (dedup_threshold=None keeps every image); this is
+# the suggested value when enabling it
+DEDUP_THRESHOLD = 2
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def perceptual_hashes(images):
+    """64-bit DCT perceptual hash (pHash) of every image in a uint8 array.
+
+    Each bit says whether one of the 8x8 lowest DCT frequencies of the
+    32x32 thumbnail is above their median, so small shifts, lighting and
+    JPEG noise barely change the hash while a different pose does.
+    """
+    hashes = np.empty(len(images), dtype=np.uint64)
+    weights = np.uint64(1) << np.arange(64, dtype=np.uint64)
+    for i, image in enumerate(images):
+        small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+        low = cv2.dct(small)[:8, :8].ravel()
+        bits = low > np.median(low[1:])  # the DC term only carries overall brightness
+        hashes[i] = np.bitwise_or.reduce(weights[bits]) if bits.any() else 0
+    return hashes
+
+
+def hamming_distances(hashes, other):
+    """Number of differing bits between each of `hashes` (uint64 array) and the hash `other`"""
+    diff = np.bitwise_xor(hashes, np.uint64(other))
+    return _POPCOUNT[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def find_near_duplicates(paths, hashes, threshold=DEDUP_THRESHOLD):
+    """Indices to keep when images within `threshold` bits of an earlier one are dropped.
+
+    `paths` and `hashes` should cover a single person; images are visited
+    in path order so the same files are kept on every build.
+    """
+    kept = []
+    for i in sorted(range(len(paths)), key=lambda i: paths[i]):
+        if kept and hamming_distances(hashes[kept], hashes[i]).min() <= threshold:
+            continue
+        kept.append(i)
+    return sorted(kept)
+
+
+class DatasetStore:
+    """Decoded face images cached by file path, mtime and size.
+
+    `update()` rescans the face data directory and only decodes images that
+    were added or changed since the last run; rows of deleted images are
+    dropped. With use_hash=True a file whose mtime changed but whose content
+    hash did not (e.g. a copy or a touch) is not decoded again either.
+
+    Images are decoded by a pool of `workers` threads (OpenCV releases the
+    GIL while decoding) straight into a preallocated uint8 array. The
+    perceptual hash of every image (see perceptual_hashes) is computed once
+    when it is decoded and cached alongside it.
+    """
+
+    def __init__(self, cache_path='face_cache.npz', img_size=(92, 112), use_hash=False, workers=None):
+        self.cache_path = Path(cache_path)
+        self.img_size = img_size
+        self.use_hash = use_hash
+        self.workers = workers or os.cpu_count() or 1
+
+        self.images = np.empty((0, img_size[1], img_size[0]), dtype=np.uint8)
+        self.paths = []
+        self.mtimes = []
+        self.sizes = []
+        self.hashes = []
+        self.phashes = np.empty(0, dtype=np.uint64)
+        self.dirty = False  # cache contents changed without any file changing
+
+        if self.cache_path.exists():
+            self.load()
+
+    def load(self):
+        try:
+            cache = np.load(self.cache_path)
+            images = cache['images']
+            if images.shape[1:] != self.images.shape[1:]:
+                print(f"Cache {self.cache_path} has a different image size, rebuilding")
+                return
+            self.images = images
+            self.paths = cache['paths'].tolist()
+            self.mtimes = cache['mtimes'].tolist()
+            self.sizes = cache['sizes'].tolist()
+            self.hashes = cache['hashes'].tolist()
+            if 'phashes' in cache.files:
+                self.phashes = cache['phashes']
+            else:
+                # Cache written before perceptual hashes were stored
+                self.phashes = perceptual_hashes(self.images)
+                self.dirty = True
+        except Exception as e:
+            print(f"Warning: could not read cache {self.cache_path} ({e}), rebuilding")
+
+    def save(self):
+        tmp_path = self.cache_path.with_name(self.cache_path.stem + '.tmp.npz')
+        np.savez(tmp_path,
+                 images=self.images,
+                 paths=np.array(self.paths, dtype=str),
+                 mtimes=np.array(self.mtimes, dtype=np.int64),
+                 sizes=np.array(self.sizes, dtype=np.int64),
+                 hashes=np.array(self.hashes, dtype=str),
+                 phashes=self.phashes)
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
+
+    def _decode(self, paths):
+        """Decode and resize images in parallel; returns (kept paths, uint8 array)"""
+        array = np.empty((len(paths),) + self.images.shape[1:], dtype=np.uint8)
+        if not paths:
+            return [], array
+
+        def decode_into(i):
+            img = cv2.imread(paths[i], cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                return False
+            cv2.resize(img, self.img_size, dst=array[i])
+            return True
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            ok = list(pool.map(decode_into, range(len(paths)), chunksize=64))
+        elapsed = time.perf_counter() - start
+        print(f"Decoded {sum(ok)} images with {self.workers} workers in {elapsed:.2f}s "
+              f"({len(paths) / elapsed:.0f} images/s)")
+
+        if all(ok):
+            return list(paths), array
+        # Unreadable files leave holes; compact them out
+        return [p for p, good in zip(paths, ok) if good], array[np.flatnonzero(ok)]
+
+    def update(self, image_paths):
+        """Synchronise the cache with the given image files; returns (added, changed, removed)"""
+        cached = {path: i for i, path in enumerate(self.paths)}
+        current = set(image_paths)
+
+        keep_rows, to_decode, stats = [], [], {}
+        added = changed = 0
+        for path in image_paths:
+            st = os.stat(path)
+            stats[path] = (st.st_mtime_ns, st.st_size)
+            row = cached.get(path)
+            if row is not None and (self.mtimes[row], self.sizes[row]) == stats[path]:
+                keep_rows.append(row)
+            elif (row is not None and self.use_hash and self.sizes[row] == st.st_size
+                  and self.hashes[row] == file_hash(path)):
+                # Only the timestamp moved: keep the decoded image, refresh the key
+                self.mtimes[row] = st.st_mtime_ns
+                keep_rows.append(row)
+            else:
+                to_decode.append(path)
+                if row is None:
+                    added += 1
+                else:
+                    changed += 1
+        removed = sum(1 for path in self.paths if path not in current)
+
+        if not to_decode and removed == 0 and len(keep_rows) == len(self.paths):
+            return 0, 0, 0
+
+        new_paths, new_images = self._decode(to_decode)
+        self.images = np.concatenate([self.images[keep_rows], new_images])
+        self.phashes = np.concatenate([self.phashes[keep_rows], perceptual_hashes(new_images)])
+        self.paths = [self.paths[i] for i in keep_rows] + new_paths
+        self.mtimes = [stats[p][0] for p in self.paths]
+        self.sizes = [stats[p][1] for p in self.paths]
+        old_hashes = {self.paths[i]: self.hashes[r] for i, r in enumerate(keep_rows)}
+        self.hashes = [old_hashes.get(p) or (file_hash(p) if self.use_hash else '') for p in self.paths]
+        return added, changed, removed
+
+
+class ShardedImages:
+    """Read-only view over memory-mapped .npy image shards, indexable like one array"""
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.offsets = np.cumsum([0] + [len(shard) for shard in shards])
+        self.shape = (int(self.offsets[-1]),) + (shards[0].shape[1:] if shards else ())
+        self.dtype = np.uint8
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, indices):
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        out = np.empty((len(indices),) + self.shape[1:], dtype=np.uint8)
+        shard_of = np.searchsorted(self.offsets, indices, side='right') - 1
+        for shard_idx in np.unique(shard_of):
+            rows = np.flatnonzero(shard_of == shard_idx)
+            out[rows] = self.shards[shard_idx][indices[rows] - self.offsets[shard_idx]]
+        return out
+
+
+class FaceDataset:
+    """A built face dataset: uint8 images, labels, train/test split and label map.
+
+    Opened from either the legacy face_dataset.npz or a sharded dataset
+    directory (manifest.json + images-*.npy + labels/train/test .npy). The
+    sharded form is memory-mapped, so only the batches being used are read.
+    """
+
+    def __init__(self, images, labels, train_idx, test_idx, label_map):
+        self.images = images
+        self.labels = labels
+        self.train_idx = train_idx
+        self.test_idx = test_idx
+        self.label_map = label_map  # {person_id: label index}
+
+    def split(self, name):
+        """Return (images, labels, indices) for 'train' or 'test'"""
+        indices = self.train_idx if name == 'train' else self.test_idx
+        return self.images, self.labels, indices
+
+
+def is_sharded(dataset_path):
+    return not str(dataset_path).endswith('.npz')
+
+
+def write_sharded_dataset(dataset_path, images, labels, label_map, train_idx, test_idx,
+                          img_size=(92, 112), shard_size=4096):
+    """Write images as raw uint8 .npy shards plus a JSON manifest"""
+    out_dir = Path(dataset_path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for old_shard in out_dir.glob("images-*.npy"):
+        old_shard.unlink()
+
+    shards = []
+    for i, start in enumerate(range(0, len(images), shard_size)):
+        name = f"images-{i:05d}.npy"
+        np.save(out_dir / name, np.ascontiguousarray(images[start:start + shard_size], dtype=np.uint8))
+        shards.append({'file': name, 'count': int(min(shard_size, len(images) - start))})
+    np.save(out_dir / "labels.npy", np.asarray(labels, dtype=np.int32))
+    np.save(out_dir / "train.npy", np.asarray(train_idx, dtype=np.int64))
+    np.save(out_dir / "test.npy", np.asarray(test_idx, dtype=np.int64))
+
+    manifest = {
+        'img_size': list(img_size),
+        'shards': shards,
+        'label_map': {str(person_id): int(label) for person_id, label in label_map.items()},
+    }
+    with open(out_dir / "manifest.json", 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def open_dataset(dataset_path):
+    """Open a dataset written by create_npz_dataset, in either format"""
+    if not is_sharded(dataset_path):
+        data = np.load(dataset_path)
+        train_count = len(data['trainY'])
+        images = np.concatenate([data['trainX'], data['testX']])
+        labels = np.concatenate([data['trainY'], data['testY']])
+        return FaceDataset(images, labels, np.arange(train_count), np.arange(train_count, len(labels)),
+                           {int(p): int(l) for p, l in data['label_map']})
+
+    dataset_dir = Path(dataset_path)
+    with open(dataset_dir / "manifest.json", 'r') as f:
+        manifest = json.load(f)
+    shards = [np.load(dataset_dir / shard['file'], mmap_mode='r') for shard in manifest['shards']]
+    return FaceDataset(ShardedImages(shards),
+                       np.load(dataset_dir / "labels.npy"),
+                       np.load(dataset_dir / "train.npy"),
+                       np.load(dataset_dir / "test.npy"),
+                       {int(p): int(l) for p, l in manifest['label_map'].items()})
+
+
+def read_label_map(dataset_path):
+    """Read only the {person_id: label index} map of a dataset in either format"""
+    if not is_sharded(dataset_path):
+        return {int(p): int(l) for p, l in np.load(dataset_path)['label_map']}
+    with open(Path(dataset_path) / "manifest.json", 'r') as f:
+        return {int(p): int(l) for p, l in json.load(f)['label_map'].items()}
+
+
+def scan_face_data(data_dir):
+    """Return {person_id: (person_dir, [image paths])} for every person*/ directory, in label order"""
+    people = {}
+    for person_dir in sorted(Path(data_dir).glob("person*")):
+        if not person_dir.is_dir():
+            continue
+        try:
+            # Extract numeric person ID from directory name
+            person_id = int(person_dir.name.replace("person", ""))
+        except ValueError as e:
+            print(f"Error processing {person_dir}: {e}")
+            continue
+        if person_id not in people:
+            people[person_id] = (str(person_dir), sorted(str(p) for p in person_dir.glob("face*.jpg")))
+    return people
+
+
+def write_label_names(label_map, names_path='person_names.json', label_names_path=None):
+    """Write the label index -> name map recognition needs and return it.
+
+    `label_map` is {person_id: label index}; names come from the person-id
+    keyed `names_path`, which is only read. `label_names_path` defaults to
+    label_names.json next to `names_path`.
+    """
+    person_names = {}
+    if os.path.exists(names_path):
+        try:
+            with open(names_path, 'r') as f:
+                person_names = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Warning: {names_path} is not valid JSON. Starting with empty dictionary.")
+
+    id_to_name = {}
+    for person_id, label_idx in label_map.items():
+        id_to_name[str(label_idx)] = person_names.get(str(person_id), f"Person {person_id}")
+
+    # person_names.json stays keyed by person ID so names never shift when labels are renumbered
+    if label_names_path is None:
+        label_names_path = os.path.join(os.path.dirname(str(names_path)), LABEL_NAMES_FILE)
+    with open(label_names_path, 'w') as f:
+        json.dump(id_to_name, f)
+    print(f"ID to name map: {id_to_name}")
+    print(f"Label names saved to {label_names_path}")
+    return id_to_name
+
+
+def create_npz_dataset(data_dir='face_data', img_size=(92, 112), names_path='person_names.json',
+                       dataset_path='face_dataset.npz', cache_path='face_cache.npz', use_hash=False,
+                       workers=None, dedup_threshold=None, label_names_path=None):
+    """Build face_dataset.npz from the face images, decoding only new or changed files.
+
+    `names_path` (person_names.json) maps person IDs to names and is only
+    read. The label index -> name map the softmax model needs is written to
+    `label_names_path`, by default label_names.json next to `names_path`.
+
+    A dataset_path without the .npz suffix is written in the memory-mappable
+    sharded format instead (see write_sharded_dataset / open_dataset).
+    With `dedup_threshold` set, images of a person whose perceptual hash is
+    within that many bits of one already kept are left out (None, the
+    default, or a negative value keeps everything), so burst captures neither bloat the dataset nor leak
+    across the train/test split.
+    Returns (train samples, test samples), or None when there are no images.
+    """
+    print("Creating dataset from collected face images...")
+    data_dir = Path(data_dir)
+    if not data_dir.exists():
+        print(f"No face data directory found at '{data_dir}'. Please collect face images first.")
+        return None
+
+    people = scan_face_data(data_dir)
+    all_paths = [path for _, paths in people.values() for path in paths]
+
+    start = time.perf_counter()
+    store = DatasetStore(cache_path, img_size, use_hash, workers)
+    added, changed, removed = store.update(all_paths)
+    print(f"Image cache: {added} added, {changed} changed, {removed} removed, "
+          f"{len(store.paths) - added - changed} reused")
+    if added or changed or removed or store.dirty:
+        store.save()
+
+    # Create sequential label index for every person, in directory order
+    label_map = {person_id: label for label, person_id in enumerate(people)}
+    label_of_dir = {people[person_id][0]: label for person_id, label in label_map.items()}
+    labels = np.array([label_of_dir[os.path.dirname(path)] for path in store.paths], dtype=np.int64)
+    X, y = store.images, labels
+
+    if dedup_threshold is not None and dedup_threshold >= 0 and len(X):
+        keep, dropped = [], {}
+        for person_id, label in label_map.items():
+            rows = np.flatnonzero(labels == label)
+            kept = rows[find_near_duplicates([store.paths[i] for i in rows], store.phashes[rows],
+                                             dedup_threshold)]
+            keep.append(kept)
+            dropped[person_id] = (len(rows) - len(kept), len(rows))
+        keep = np.sort(np.concatenate(keep))
+        X, y = X[keep], y[keep]
+        print(f"Near-duplicates dropped (threshold {dedup_threshold} bits): "
+              f"{sum(d for d, _ in dropped.values())} of {len(labels)} images")
+        for person_id, (count, total) in dropped.items():
+            print(f"  - person{person_id}: {count}/{total}")
+
+    if len(X) == 0:
+        print("No images found. Please collect face data first.")
+        return None
+
+    indices = np.random.permutation(len(X))
+    split_idx = int(len(X) * 0.8)
+    train_idx, test_idx = indices[:split_idx], indices[split_idx:]
+
+    if is_sharded(dataset_path):
+        # Images stay in cache order; the split is stored as index arrays
+        write_sharded_dataset(dataset_path, X, y, label_map, train_idx, test_idx, img_size)
+    else:
+        np.savez(dataset_path,
+                 trainX=X[train_idx], trainY=y[train_idx],
+                 testX=X[test_idx], testY=y[test_idx],
+                 label_map=np.array(list(label_map.items())))
+
+    # Save the label-to-name mapping for the recognition phase
+    print(f"Label map: {label_map}")
+    write_label_names(label_map, names_path, label_names_path)
+
+    print(f"Dataset created successfully in {time.perf_counter() - start:.2f}s!")
+    print(f"Training samples: {len(train_idx)}")
+    print(f"Testing samples: {len(test_idx)}")
+    print(f"Classes: {len(label_map)}")
+    return len(train_idx), len(test_idx)
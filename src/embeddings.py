@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import cv2
+import tensorflow as tf
+from pathlib import Path
+from tensorflow.keras.layers import Dense
+
+
+def create_embedding_model(model):
+    """Turn a trained create_model() classifier into a feature extractor.
+
+    The conv trunk and the penultimate Dense layer are reused as is; only the
+    softmax output layer is dropped, so enrolling a new person never needs a
+    retrain and the network no longer grows with the roster.
+    """
+    dense_layers = [layer for layer in model.layers if isinstance(layer, Dense)]
+    if len(dense_layers) < 2:
+        raise ValueError("Model has no hidden Dense layer to use as embedding")
+    return tf.keras.Model(inputs=model.inputs, outputs=dense_layers[-2].output)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingIndex:
+    """Per-person face embeddings stored as one float16 matrix plus a JSON manifest.
+
+    `mode='mean'` keeps one (re-normalised) mean embedding per person,
+    `mode='samples'` keeps every enrolled sample. Lookups are cosine
+    nearest-neighbour; above `ivf_threshold` rows an inverted-file index
+    (k-means buckets, `nprobe` probed per query) keeps search sub-linear.
+    """
+
+    def __init__(self, path='face_embeddings', mode='mean', ivf_threshold=2048, nprobe=8):
+        self.path = Path(path)
+        self.matrix_path = self.path.with_suffix('.npy')
+        self.manifest_path = self.path.with_suffix('.json')
+        self.mode = mode
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+
+        self.matrix = np.empty((0, 0), dtype=np.float16)
+        self.person_ids = []  # person id for every row of the matrix
+        self.names = {}       # person id -> name
+        self._ivf = None
+        # Enrollment may happen while recognition threads are searching
+        self._lock = threading.Lock()
+
+        if self.manifest_path.exists() and self.matrix_path.exists():
+            self.load()
+
+    def load(self):
+        with open(self.manifest_path, 'r') as f:
+            manifest = json.load(f)
+        self.mode = manifest.get('mode', self.mode)
+        self.person_ids = manifest['person_ids']
+        self.names = manifest['names']
+        self.matrix = np.load(self.matrix_path, mmap_mode='r')
+        self._ivf = None
+        self._refresh_ivf()
+        print(f"Loaded {len(self.names)} enrolled persons ({len(self.person_ids)} embeddings) "
+              f"from {self.matrix_path}")
+
+    def save(self):
+        # Write to temporary files first so a crash never leaves a half-written index
+        matrix_tmp = self.matrix_path.with_name(self.matrix_path.stem + '.tmp.npy')
+        manifest_tmp = self.manifest_path.with_name(self.manifest_path.stem + '.tmp.json')
+        np.save(matrix_tmp, np.asarray(self.matrix, dtype=np.float16))
+        with open(manifest_tmp, 'w') as f:
+            json.dump({'mode': self.mode, 'person_ids': self.person_ids, 'names': self.names}, f)
+        os.replace(matrix_tmp, self.matrix_path)
+        os.replace(manifest_tmp, self.manifest_path)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_person(self, person_id, name, embeddings):
+        """Enroll (or re-enroll) a person from their sample embeddings"""
+        person_id = str(person_id)
+        embeddings = normalize(embeddings)
+        if self.mode == 'mean':
+            embeddings = normalize(embeddings.mean(axis=0, keepdims=True))
+
+        with self._lock:
+            self._remove(person_id)
+            rows = embeddings.astype(np.float16)
+            if len(self.person_ids):
+                rows = np.concatenate([np.asarray(self.matrix), rows])
+            self.matrix = rows
+            self.person_ids = self.person_ids + [person_id] * len(embeddings)
+            self.names[person_id] = name
+            self._ivf = None
+        self._refresh_ivf()
+
+    def remove_person(self, person_id):
+        with self._lock:
+            removed = self._remove(str(person_id))
+        if removed:
+            self._refresh_ivf()
+        return removed
+
+    def _remove(self, person_id):
+        if person_id not in self.names:
+            return False
+        keep = [i for i, pid in enumerate(self.person_ids) if pid != person_id]
+        self.matrix = np.asarray(self.matrix)[keep]
+        self.person_ids = [self.person_ids[i] for i in keep]
+        del self.names[person_id]
+        self._ivf = None
+        return True
+
+    def _build_ivf(self, data):
+        """Cluster the rows into ~sqrt(N) buckets with a few rounds of k-means"""
+        n_lists = int(np.sqrt(len(data)))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(data), n_lists, replace=False)]
+        for _ in range(10):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = data[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize(centroids)
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        lists = [np.flatnonzero(assignment == c) for c in range(n_lists)]
+        return centroids, lists
+
+    def _refresh_ivf(self):
+        """Rebuild the IVF buckets after the rows changed.
+
+        Runs on the enrolling (or loading) thread so search() never clusters on
+        the shared inference thread; until the new buckets are swapped in,
+        searches fall back to the exact scan.
+        """
+        with self._lock:
+            matrix = self.matrix
+        ivf = None
+        if len(matrix) >= self.ivf_threshold:
+            ivf = self._build_ivf(np.asarray(matrix, dtype=np.float32))
+        with self._lock:
+            # A concurrent enrollment changed the rows again; its own refresh wins
+            if self.matrix is matrix:
+                self._ivf = ivf
+
+    def search(self, queries):
+        """Return (person_id, similarity) of the nearest enrolled embedding for every query"""
+        with self._lock:
+            person_ids, matrix, ivf = self.person_ids, self.matrix, self._ivf
+
+        if not person_ids:
+            return [(None, 0.0) for _ in range(len(queries))]
+
+        queries = normalize(queries)
+        data = np.asarray(matrix, dtype=np.float32)
+
+        if ivf is None or len(data) < self.ivf_threshold:
+            similarities = queries @ data.T
+            best = np.argmax(similarities, axis=1)
+            return [(person_ids[row], float(similarities[i, row])) for i, row in enumerate(best)]
+
+        centroids, lists = ivf
+        probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :self.nprobe]
+
+        results = []
+        for query, probe in zip(queries, probes):
+            candidates = np.concatenate([lists[c] for c in probe])
+            if len(candidates) == 0:
+                candidates = np.arange(len(data))
+            similarities = data[candidates] @ query
+            best = int(np.argmax(similarities))
+            results.append((person_ids[candidates[best]], float(similarities[best])))
+        return results
+
+
+def embed_person_dir(extractor, person_dir, img_size=(92, 112), batch_size=64):
+    """Embed every face*.jpg of a person directory with the feature extractor"""
+    images = []
+    for img_path in sorted(Path(person_dir).glob("face*.jpg")):
+        img = cv2.imread(str(img_path), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            images.append(cv2.resize(img, img_size))
+    if not images:
+        return np.empty((0, 0), dtype=np.float32)
+
+    x = np.asarray(images, dtype=np.float32).reshape(-1, img_size[1], img_size[0], 1) / 255.0
+    return np.concatenate([extractor(x[i:i + batch_size], training=False).numpy()
+                           for i in range(0, len(x), batch_size)]).astype(np.float32)
+
+
+def enroll_person(extractor, index, person_id, name, data_dir='face_data', img_size=(92, 112)):
+    """Enroll one person from face_data/person<id>/ into the index; takes seconds, no retraining"""
+    start = time.perf_counter()
+    embeddings = embed_person_dir(extractor, Path(data_dir) / f"person{person_id}", img_size)
+    if len(embeddings) == 0:
+        print(f"No face images found for person {person_id}")
+        return False
+    index.add_person(person_id, name, embeddings)
+    index.save()
+    print(f"Enrolled {name} (ID: {person_id}) from {len(embeddings)} images "
+          f"in {time.perf_counter() - start:.2f}s")
+    return True
+
+
+def build_index(model_path='face_recognition_model.h5', index_path='face_embeddings',
+                data_dir='face_data', names_path='person_names.json', mode='mean'):
+    """Enroll every person*/ directory of the face data into a fresh index.
+
+    Names come from the person-id keyed `names_path` (face data collection),
+    not from the label-indexed file written by dataset builds.
+    """
+    from tensorflow.keras.models import load_model
+
+    extractor = create_embedding_model(load_model(model_path))
+    person_names = {}
+    if os.path.exists(names_path):
+        with open(names_path, 'r') as f:
+            person_names = json.load(f)
+
+    index = EmbeddingIndex(index_path, mode=mode)
+    for person_dir in sorted(Path(data_dir).glob("person*")):
+        person_id = person_dir.name.replace("person", "")
+        enroll_person(extractor, index, person_id, person_names.get(str(person_id), f"Person {person_id}"),
+                      data_dir)
+    print(f"Index saved to {index.matrix_path} with {len(index)} persons")
+    return index
+
+
+def main():
+    import argparse
+    from tensorflow.keras.models import load_model
+
+    parser = argparse.ArgumentParser(description='Face Embedding Index')
+    parser.add_argument('--model', dest='model_path', default='face_recognition_model.h5',
+                        help='Trained model whose trunk is used as feature extractor')
+    parser.add_argument('--index', dest='index_path', default='face_embeddings',
+                        help='Index path without extension (default: face_embeddings)')
+    parser.add_argument('--data-dir', dest='data_dir', default='face_data',
+                        help='Face data directory (default: face_data)')
+    parser.add_argument('--mode', choices=['mean', 'samples'], default='mean',
+                        help='Store one mean embedding or every sample per person (default: mean)')
+    parser.add_argument('--build', action='store_true', help='Enroll every person directory')
+    parser.add_argument('--person-id', help='Enroll a single person')
+    parser.add_argument('--person-name', help='Name of the person to enroll')
+    args = parser.parse_args()
+
+    if args.build:
+        build_index(args.model_path, args.index_path, args.data_dir, mode=args.mode)
+    elif args.person_id and args.person_name:
+        extractor = create_embedding_model(load_model(args.model_path))
+        index = EmbeddingIndex(args.index_path, mode=args.mode)
+        enroll_person(extractor, index, args.person_id, args.person_name, args.data_dir)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
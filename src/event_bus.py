@@ -0,0 +1,78 @@
+import collections
+import itertools
+import queue
+import threading
+
+
+class Subscription:
+    """One subscriber's bounded buffer of events"""
+
+    def __init__(self, bus, buffer_size):
+        self.bus = bus
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.closed = False
+
+    def get(self, timeout=None):
+        """Next event, or None if nothing arrived within timeout or the subscription was dropped"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """In-process publish/subscribe for recognition events.
+
+    `publish()` never blocks: every subscriber has a buffer of
+    `buffer_size` events, and a subscriber whose buffer is full is dropped
+    (its `closed` flag is set) instead of slowing down the recognition loop
+    or the other subscribers. The last `history` events are kept so a
+    client that reconnects can catch up from the last event id it saw.
+    """
+
+    def __init__(self, buffer_size=256, history=256):
+        self.buffer_size = buffer_size
+        self.history = collections.deque(maxlen=history)
+        self.subscribers = set()
+        self.published = 0
+        self.dropped_subscribers = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, last_event_id=None):
+        subscription = Subscription(self, self.buffer_size)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self.history:
+                    if event['id'] > last_event_id and not subscription.queue.full():
+                        subscription.queue.put_nowait(event)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscribers.discard(subscription)
+        subscription.closed = True
+
+    def publish(self, event):
+        """Send a dict to every subscriber; returns it with its event id"""
+        with self._lock:
+            event = dict(event, id=next(self._ids))
+            self.history.append(event)
+            self.published += 1
+            for subscription in list(self.subscribers):
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    # Slow client: drop it rather than buffer without bound
+                    self.subscribers.discard(subscription)
+                    subscription.closed = True
+                    self.dropped_subscribers += 1
+        return event
+
+
+# Recognition events of every stream in this process
+recognition_events = EventBus()
@@ -2,7 +2,187 @@ import cv2
 import numpy as np
 import os
 from pathlib import Path
+import dataset_store
 import json
+import queue
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from face_detection import FaceDetector
+from frame_sources import IMAGE_EXTENSIONS
+
+
+def sharpness(face):
+    """Variance of the Laplacian: low for blurred or out-of-focus crops"""
+    return cv2.Laplacian(face, cv2.CV_64F).var()
+
+
+def thumbnail(face, size=16):
+    return cv2.resize(face, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class CropFilter:
+    """Reject face crops that are too small, blurry or almost identical to a recent capture.
+
+    `min_face_size` is the smaller side of the detected box in frame pixels,
+    `blur_threshold` the minimum sharpness() of the resized crop and
+    `min_difference` the minimum mean absolute difference (0-255) between
+    16x16 thumbnails of the crop and each of the last `history` accepted ones.
+    """
+
+    def __init__(self, min_face_size=80, blur_threshold=100.0, min_difference=4.0, history=5):
+        self.min_face_size = min_face_size
+        self.blur_threshold = blur_threshold
+        self.min_difference = min_difference
+        self.recent = []
+        self.history = history
+        self.rejected = {'small': 0, 'blurry': 0, 'duplicate': 0}
+
+    def check(self, face, box):
+        """Returns None if the resized crop `face` is accepted, else the rejection reason"""
+        reason = None
+        if min(box[2], box[3]) < self.min_face_size:
+            reason = 'small'
+        elif sharpness(face) < self.blur_threshold:
+            reason = 'blurry'
+        else:
+            thumb = thumbnail(face)
+            if any(np.abs(thumb - other).mean() < self.min_difference for other in self.recent):
+                reason = 'duplicate'
+            else:
+                self.recent = (self.recent + [thumb])[-self.history:]
+        if reason is not None:
+            self.rejected[reason] += 1
+        return reason
+
+
+class ImageWriter:
+    """Encode and write images on a background thread so capture loops never wait on the disk"""
+
+    def __init__(self, queue_size=256):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._loop, name="image-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, path, image):
+        self.queue.put((str(path), image))
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            path, image = item
+            if cv2.imwrite(path, image):
+                self.written += 1
+            else:
+                self.failed += 1
+                print(f"Warning: could not write {path}")
+
+    def close(self, timeout=30):
+        """Wait for every queued image to be written"""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout)
+
+
+def plan_media_tasks(path, frames_per_task=300, images_per_task=32):
+    """Split a video, zip of photos, image or image directory into independent units of work.
+
+    Long videos are cut into segments of `frames_per_task` frames so one
+    file is processed by several workers; each task is (kind, path, items).
+    """
+    path = str(path)
+    if os.path.isdir(path):
+        files = sorted(str(p) for p in Path(path).rglob('*') if p.suffix.lower() in IMAGE_EXTENSIONS)
+        return [('files', path, files[i:i + images_per_task]) for i in range(0, len(files), images_per_task)]
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        return [('files', path, [path])]
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = sorted(n for n in archive.namelist() if n.lower().endswith(IMAGE_EXTENSIONS))
+        return [('zip', path, names[i:i + images_per_task]) for i in range(0, len(names), images_per_task)]
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot read {path}: not a video, zip archive or image")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total <= 0:
+        # Frame count unknown (some streams/containers): read it in one go
+        return [('video', path, (0, None))]
+    return [('video', path, (start, min(start + frames_per_task, total)))
+            for start in range(0, total, frames_per_task)]
+
+
+def iter_task_frames(task, frame_step=5):
+    """Yield (order key, grayscale image) for the frames a task covers, every `frame_step`-th for videos"""
+    kind, path, items = task
+    if kind == 'files':
+        for file in items:
+            gray = cv2.imread(file, cv2.IMREAD_GRAYSCALE)
+            if gray is not None:
+                yield (path, file), gray
+    elif kind == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            for name in items:
+                data = np.frombuffer(archive.read(name), dtype=np.uint8)
+                gray = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+                if gray is not None:
+                    yield (path, name), gray
+    else:
+        start, stop = items
+        cap = cv2.VideoCapture(path)
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while stop is None or index < stop:
+            if index % frame_step:
+                # grab() skips the decode of frames we don't sample
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield (path, f"{index:09d}"), cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            index += 1
+        cap.release()
+
+
+_detectors = threading.local()
+
+
+def extract_faces(task, img_size=(92, 112), frame_step=5, detect_scale=1.0):
+    """Crop the largest face of every sampled frame of a task; returns (frames read, [(order, crop, box)])"""
+    # CascadeClassifier is not thread-safe, so every worker thread keeps its own detector
+    detector = getattr(_detectors, 'detector', None)
+    if detector is None or detector.scale != min(1.0, detect_scale):
+        detector = _detectors.detector = FaceDetector(detect_scale)
+    frames, crops = 0, []
+    for order, gray in iter_task_frames(task, frame_step):
+        frames += 1
+        faces = detector.detect(gray)[0]
+        if len(faces) == 0:
+            continue
+        x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+        crops.append((order, cv2.resize(gray[y:y+h, x:x+w], img_size), (x, y, w, h)))
+    return frames, crops
+
+
+def next_image_index(person_dir):
+    """First face<N>.jpg number not used in person_dir, so new images never overwrite old ones"""
+    numbers = [-1]
+    for path in Path(person_dir).glob("face*.jpg"):
+        match = re.fullmatch(r"face(\d+)\.jpg", path.name)
+        if match:
+            numbers.append(int(match.group(1)))
+    return max(numbers) + 1
+
 
 class FaceDataCollector:
     def __init__(self, data_dir='face_data', img_size=(92, 112), names_path='person_names.json'):
@@ -10,9 +190,6 @@ class FaceDataCollector:
         self.data_dir.mkdir(exist_ok=True)
         self.img_size = img_size
         self.names_path = names_path
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
         self.person_names = self.load_person_names()
 
     def load_person_names(self):
@@ -29,13 +206,28 @@ class FaceDataCollector:
                 return {}
         return {}
 
-    def collect_face_data(self, person_id, person_name, num_images=100):
-        """Collect face data from webcam for a person"""
+    def collect_face_data(self, person_id, person_name, num_images=100, detect_scale=1.0, detect_interval=1,
+                          job=None, auto=False, capture_rate=10.0, crop_filter=None):
+        """Collect face data from webcam for a person.
+
+        detect_scale/detect_interval make the live preview cheaper (see
+        face_detection.FaceDetector); captures always use a fresh detection.
+        With a job_manager.Job, progress is reported to it and cancelling the
+        job ends the collection like pressing 'q'.
+
+        With auto=True a crop is captured without pressing 'c', at most
+        `capture_rate` times per second, whenever exactly one face is visible
+        and it passes `crop_filter` (a CropFilter with default thresholds
+        unless given). Images are written by a background ImageWriter.
+        """
         person_id_str = str(person_id)
         person_dir = self.data_dir / f"person{person_id}"
         person_dir.mkdir(exist_ok=True)
+        # Continue after existing images so re-collecting a person adds to their data
+        first_index = next_image_index(person_dir)
 
         cap = cv2.VideoCapture(0)
+        detector = FaceDetector(detect_scale, detect_interval)
         images_collected = 0
         save_name = False  # Track if we should update person_names.json
 
@@ -43,19 +235,31 @@ class FaceDataCollector:
             print("Error: Could not open camera.")
             return
 
+        if auto and crop_filter is None:
+            crop_filter = CropFilter()
+        writer = ImageWriter()
+        capture_every = 1.0 / capture_rate if capture_rate > 0 else 0.0
+        last_capture = 0.0
+        started = time.perf_counter()
+
         print(f"Collecting face data for {person_name} (ID: {person_id})")
-        print("Press 'c' to capture image. Press 'q' to stop.")
+        if auto:
+            print(f"Capturing automatically at up to {capture_rate:g} images/s. Press 'q' to stop.")
+        else:
+            print("Press 'c' to capture image. Press 'q' to stop.")
 
         cv2.namedWindow('Collecting Face Data', cv2.WINDOW_NORMAL)
 
         while images_collected < num_images:
+            if job is not None and job.cancelled():
+                break
             ret, frame = cap.read()
             if not ret:
                 print("Failed to grab frame")
                 break
 
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.1, 5)
+            faces = detector(gray)
 
             for (x, y, w, h) in faces:
                 cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
@@ -65,19 +269,32 @@ class FaceDataCollector:
             cv2.imshow('Collecting Face Data', frame)
 
             key = cv2.waitKey(1)
-            if key == ord('c') and len(faces) == 1:
+            if key == ord('q'):
+                break
+            capture = key == ord('c')
+            if auto and len(faces) == 1 and time.perf_counter() - last_capture >= capture_every:
+                capture = True
+            if capture and detect_interval > 1:
+                # Tracked boxes may lag behind; crop from an up-to-date detection
+                faces = detector.detect(gray)[0]
+            if capture and len(faces) == 1:
                 x, y, w, h = faces[0]
                 face = gray[y:y+h, x:x+w]
                 face = cv2.resize(face, self.img_size)
-                cv2.imwrite(str(person_dir / f"face{images_collected}.jpg"), face)
+                if auto:
+                    last_capture = time.perf_counter()
+                    if crop_filter.check(face, faces[0]) is not None:
+                        continue
+                writer.write(person_dir / f"face{first_index + images_collected}.jpg", face)
                 images_collected += 1
                 save_name = True
                 print(f"Captured image {images_collected}/{num_images}")
-            elif key == ord('q'):
-                break
+                if job is not None:
+                    job.update(images_collected / num_images, images=images_collected)
 
         cap.release()
         cv2.destroyAllWindows()
+        writer.close()
 
         if save_name:
             self.person_names[person_id_str] = person_name
@@ -85,72 +302,87 @@ class FaceDataCollector:
                 json.dump(self.person_names, f)
             print(f"Name saved to {self.names_path}")
 
-        print(f"Data collection complete. Collected {images_collected} images.")
-
-    def create_npz_dataset(self):
-        """Create NPZ dataset from collected face images"""
-        print("Creating dataset from collected face images...")
-        images, labels = [], []
-        label_map = {}  # Maps person ID to label index
-        current_label = 0
-
-        for person_dir in sorted(self.data_dir.glob("person*")):
-            try:
-            # Extract the numeric ID from directory name (e.g., "person1" -> 1)
-                person_id = int(person_dir.name.replace("person", ""))
-            
-            # Assign a sequential label index for this person ID
-                if person_id not in label_map:
-                    label_map[person_id] = current_label
-                    current_label += 1
-
-                label = label_map[person_id]
-            
-                for img_path in person_dir.glob("face*.jpg"):
-                    img = cv2.imread(str(img_path), cv2.IMREAD_GRAYSCALE)
-                    if img is not None:
-                        img = cv2.resize(img, self.img_size)  # Ensure correct size
-                        images.append(img)
-                        labels.append(label)
-            except Exception as e:
-                print(f"Error processing {person_dir}: {e}")
-
-        if not images:
-            print("No images found. Please collect face data first.")
-            return 0, 0
+        print(f"Data collection complete. Collected {images_collected} images "
+              f"in {time.perf_counter() - started:.1f}s.")
+        if auto:
+            print(f"Rejected crops: {crop_filter.rejected}")
+        return images_collected
+
+    def enroll_from_media(self, people, max_images=100, frame_step=5, workers=None, detect_scale=1.0,
+                          min_face_size=80, blur_threshold=100.0, min_difference=4.0, job=None):
+        """Enroll people from video files, zip archives of photos, images or image directories.
+
+        `people` is a list of (person_id, person_name, [paths]). Every file is
+        split into tasks (video segments, groups of photos) that are decoded
+        and searched for faces on `workers` threads; the largest face of each
+        sampled frame is kept. Crops then pass a CropFilter per person, in
+        frame order, and at most `max_images` are written (after any
+        existing images) to face_data/person<id>/ by a background
+        ImageWriter. Returns {person_id: summary}.
+        """
+        workers = workers or os.cpu_count() or 4
+        started = time.perf_counter()
+        tasks = []
+        for person_id, _, paths in people:
+            for path in paths:
+                tasks.extend((person_id, task) for task in plan_media_tasks(path))
+        print(f"Enrolling {len(people)} people from {sum(len(p[2]) for p in people)} files "
+              f"({len(tasks)} tasks, {workers} workers)")
+
+        frames = {person_id: 0 for person_id, _, _ in people}
+        crops = {person_id: [] for person_id, _, _ in people}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(extract_faces, task, self.img_size, frame_step, detect_scale): person_id
+                       for person_id, task in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                person_id = futures[future]
+                read, found = future.result()
+                frames[person_id] += read
+                crops[person_id].extend(found)
+                if job is not None:
+                    job.update(done / len(futures), frames=sum(frames.values()),
+                               faces=sum(len(c) for c in crops.values()))
+                    if job.cancelled():
+                        for pending in futures:
+                            pending.cancel()
+                        return None
+
+        writer = ImageWriter()
+        self.person_names = self.load_person_names()
+        summary = {}
+        for person_id, person_name, _ in people:
+            person_dir = self.data_dir / f"person{person_id}"
+            person_dir.mkdir(exist_ok=True)
+            index = next_image_index(person_dir)
+            crop_filter = CropFilter(min_face_size, blur_threshold, min_difference)
+            written = 0
+            for _, face, box in sorted(crops[person_id], key=lambda c: c[0]):
+                if written >= max_images:
+                    break
+                if crop_filter.check(face, box) is None:
+                    writer.write(person_dir / f"face{index + written}.jpg", face)
+                    written += 1
+            if written:
+                self.person_names[str(person_id)] = person_name
+            summary[person_id] = {'name': person_name, 'frames': frames[person_id],
+                                  'faces': len(crops[person_id]), 'images': written,
+                                  'rejected': crop_filter.rejected}
+            print(f"  - Person {person_id} ({person_name}): {written} images from {frames[person_id]} frames, "
+                  f"rejected {crop_filter.rejected}")
+        writer.close()
 
-        X, y = np.array(images), np.array(labels)
-        indices = np.random.permutation(len(X))
-        split_idx = int(len(X) * 0.8)
-
-        trainX, trainY = X[indices[:split_idx]], y[indices[:split_idx]]
-        testX, testY = X[indices[split_idx:]], y[indices[split_idx:]]
-
-        np.savez('face_dataset.npz', 
-                trainX=trainX, trainY=trainY, 
-                testX=testX, testY=testY,
-                label_map=np.array(list(label_map.items())))  # Save the mapping too
-
-    # Create a reverse mapping from label indices to person IDs for recognition
-    # This is crucial for correct identification during recognition
-        id_to_name = {}
-        for person_id, label_idx in label_map.items():
-            person_name = self.person_names.get(str(person_id), f"Person {person_id}")
-            id_to_name[str(label_idx)] = person_name
-    
-        print(f"Label map: {label_map}")
-        print(f"ID to name map: {id_to_name}")
-    
-    # Save the label-to-name mapping for the recognition phase
         with open(self.names_path, 'w') as f:
-            json.dump(id_to_name, f)
-
-        print(f"Dataset created successfully!")
-        print(f"Training samples: {len(trainX)}")
-        print(f"Testing samples: {len(testX)}")
-        print(f"Classes: {len(label_map)}")
+            json.dump(self.person_names, f)
+        print(f"Enrollment complete in {time.perf_counter() - started:.1f}s. Names saved to {self.names_path}")
+        return summary
 
-        return len(trainX), len(testX)
+    def create_npz_dataset(self, workers=None, dedup_threshold=None):
+        """Create NPZ dataset from collected face images"""
+        result = dataset_store.create_npz_dataset(self.data_dir, self.img_size, self.names_path,
+                                                  workers=workers, dedup_threshold=dedup_threshold)
+        if result is None:
+            return 0, 0
+        return result
 
 
 def main():
@@ -160,16 +392,61 @@ def main():
     parser.add_argument('--person-name', help='Person name for data collection')
     parser.add_argument('--num-images', type=int, default=100, help='Number of images to collect (default: 100)')
     parser.add_argument('--create-dataset', action='store_true', help='Create dataset from collected images')
+    parser.add_argument('--workers', type=int, default=None, help='Image decoding threads (default: CPU count)')
+    parser.add_argument('--dedup-threshold', type=int, default=None,
+                        help='Drop images within this many perceptual-hash bits of another image of the '
+                             f'same person when creating the dataset, e.g. {dataset_store.DEDUP_THRESHOLD} '
+                             '(default: keep all)')
+    parser.add_argument('--detect-scale', type=float, default=1.0,
+                        help='Downscale preview frames by this factor before face detection (default: 1.0)')
+    parser.add_argument('--detect-interval', type=int, default=1,
+                        help='Detect faces every N preview frames (default: 1)')
+    parser.add_argument('--auto', action='store_true',
+                        help="Capture automatically instead of pressing 'c'")
+    parser.add_argument('--capture-rate', type=float, default=10.0,
+                        help='Automatic captures per second (default: 10)')
+    parser.add_argument('--min-face-size', type=int, default=80,
+                        help='Reject faces smaller than this many pixels in auto/media mode (default: 80)')
+    parser.add_argument('--blur-threshold', type=float, default=100.0,
+                        help='Reject crops with a lower Laplacian variance in auto/media mode (default: 100)')
+    parser.add_argument('--min-difference', type=float, default=4.0,
+                        help='Reject crops closer than this to a recent capture in auto/media mode (default: 4)')
+    parser.add_argument('--media', nargs='+',
+                        help='Enroll --person-id from videos, zips of photos, images or image folders')
+    parser.add_argument('--manifest',
+                        help='Enroll a cohort from a JSON list of {"personId", "personName", "files"}')
+    parser.add_argument('--frame-step', type=int, default=5,
+                        help='Use every Nth video frame when enrolling from media (default: 5)')
 
     args = parser.parse_args()
     collector = FaceDataCollector()
 
     if args.create_dataset:
-        collector.create_npz_dataset()
+        collector.create_npz_dataset(workers=args.workers, dedup_threshold=args.dedup_threshold)
+        return
+
+    if args.manifest or args.media:
+        if args.manifest:
+            base = Path(args.manifest).parent
+            with open(args.manifest) as f:
+                people = [(p['personId'], p['personName'], [str(base / file) for file in p['files']])
+                          for p in json.load(f)]
+        elif args.person_id is not None and args.person_name:
+            people = [(args.person_id, args.person_name, args.media)]
+        else:
+            parser.error('--media needs --person-id and --person-name')
+        collector.enroll_from_media(people, args.num_images, args.frame_step, args.workers, args.detect_scale,
+                                    args.min_face_size, args.blur_threshold, args.min_difference)
         return
 
     if args.person_id is not None and args.person_name:
-        collector.collect_face_data(args.person_id, args.person_name, args.num_images)
+        # Manual captures are chosen by hand and never filtered
+        crop_filter = None
+        if args.auto:
+            crop_filter = CropFilter(args.min_face_size, args.blur_threshold, args.min_difference)
+        collector.collect_face_data(args.person_id, args.person_name, args.num_images,
+                                    args.detect_scale, args.detect_interval, auto=args.auto,
+                                    capture_rate=args.capture_rate, crop_filter=crop_filter)
         return
 
     while True:
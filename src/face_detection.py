@@ -0,0 +1,163 @@
+import cv2
+import numpy as np
+
+CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def clip_box(box, width, height):
+    """Clip an (x, y, w, h) box to a width x height frame; None if nothing of it is left"""
+    x, y, w, h = (int(v) for v in box)
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + w), min(height, y + h)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return np.array([x0, y0, x1 - x0, y1 - y0], dtype=np.int32)
+
+
+def create_tracker(name):
+    """Create an OpenCV single-object tracker such as 'kcf', 'csrt' or 'mil'.
+
+    KCF and CSRT need opencv-contrib; MIL ships with every OpenCV build.
+    """
+    name = name.upper()
+    for module in (cv2, getattr(cv2, 'legacy', None)):
+        factory = getattr(module, f"Tracker{name}_create", None) if module is not None else None
+        if factory is not None:
+            return factory()
+    raise ValueError(f"OpenCV tracker '{name}' is not available in this OpenCV build")
+
+
+class FaceDetector:
+    """Haar cascade face detector with downscaling and detect-every-N-frames tracking.
+
+    `scale` shrinks the frame before the cascade runs (boxes are mapped back
+    to full resolution), but never below `min_detect_height` pixels so small
+    inputs such as replayed face crops are still found. The cascade runs on
+    every `detect_interval`-th frame; in between, faces are followed with an
+    OpenCV tracker (`tracker='kcf'`, `'csrt'`, `'mil'`) or, with the default
+    `tracker='iou'`, kept at their last detected position.
+
+    On detection frames new boxes are matched to the previous ones by IoU, so
+    `track_ids` gives every face an ID that is stable while it stays in view.
+    A face the cascade misses keeps its ID for up to `max_missed` detections.
+
+    The detector keeps per-stream state and a CascadeClassifier, which is not
+    thread-safe, so use one instance per thread, fed frames in order.
+    """
+
+    def __init__(self, scale=1.0, detect_interval=1, tracker='iou', min_detect_height=240,
+                 scale_factor=1.1, min_neighbors=5, iou_threshold=0.3, max_missed=5, cascade_path=None):
+        self.cascade = cv2.CascadeClassifier(cascade_path or CASCADE_PATH)
+        self.scale = min(1.0, float(scale))
+        self.detect_interval = max(1, int(detect_interval))
+        self.tracker = tracker
+        if tracker != 'iou':
+            create_tracker(tracker)  # fail early if this OpenCV build lacks it
+        self.min_detect_height = min_detect_height
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+
+        self.frames = 0
+        self.detections = 0
+        self.boxes = np.empty((0, 4), dtype=np.int32)
+        self.track_ids = []
+        self._trackers = []
+        self._missing = {}  # track id -> (last box, detections missed)
+        self._next_id = 0
+
+    def _frame_scale(self, gray):
+        if self.scale >= 1.0:
+            return 1.0
+        return max(self.scale, min(1.0, self.min_detect_height / float(gray.shape[0])))
+
+    def detect(self, gray):
+        """Run the cascade on a downscaled copy of the frame; returns full-resolution boxes"""
+        scale = self._frame_scale(gray)
+        small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale,
+                                                     interpolation=cv2.INTER_AREA)
+        boxes = self.cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors)
+        if len(boxes) == 0:
+            return np.empty((0, 4), dtype=np.int32), small, scale
+        return np.round(np.asarray(boxes) / scale).astype(np.int32), small, scale
+
+    def _assign_ids(self, boxes):
+        """Keep the ID of the previous (or recently missed) box each new box overlaps most"""
+        previous = list(zip(self.boxes, self.track_ids))
+        previous += [(box, track_id) for track_id, (box, _) in self._missing.items()]
+        ids, taken = [], set()
+        for box in boxes:
+            best, best_iou = None, self.iou_threshold
+            for previous_box, track_id in previous:
+                overlap = iou(box, previous_box)
+                if track_id not in taken and overlap >= best_iou:
+                    best, best_iou = track_id, overlap
+            if best is None:
+                best = self._next_id
+                self._next_id += 1
+            taken.add(best)
+            ids.append(best)
+
+        missing = {}
+        for previous_box, track_id in previous:
+            if track_id not in taken:
+                missed = self._missing.get(track_id, (None, 0))[1] + 1
+                if missed <= self.max_missed:
+                    missing[track_id] = (previous_box, missed)
+        self._missing = missing
+        return ids
+
+    def _track(self, gray):
+        """Move the boxes of the last detection with the OpenCV trackers.
+
+        Lost faces, and faces that drifted out of the frame, are dropped;
+        boxes partly outside are clipped so their crops are never empty.
+        """
+        scale = self._frame_scale(gray)
+        small = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale,
+                                                     interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_GRAY2BGR)
+        boxes, ids, trackers = [], [], []
+        for tracker, track_id in zip(self._trackers, self.track_ids):
+            ok, box = tracker.update(small)
+            if ok:
+                box = clip_box(np.round(np.asarray(box) / scale), gray.shape[1], gray.shape[0])
+            if ok and box is not None:
+                boxes.append(box)
+                ids.append(track_id)
+                trackers.append(tracker)
+        self._trackers = trackers
+        return np.asarray(boxes, dtype=np.int32).reshape(-1, 4), ids
+
+    def __call__(self, gray):
+        if self.frames % self.detect_interval == 0:
+            boxes, small, scale = self.detect(gray)
+            self.track_ids = self._assign_ids(boxes)
+            self.detections += 1
+            if self.tracker != 'iou' and self.detect_interval > 1:
+                small = cv2.cvtColor(small, cv2.COLOR_GRAY2BGR)
+                self._trackers = []
+                for box in boxes:
+                    tracker = create_tracker(self.tracker)
+                    tracker.init(small, tuple(int(v) for v in np.round(box * scale)))
+                    self._trackers.append(tracker)
+        elif self.tracker != 'iou':
+            boxes, self.track_ids = self._track(gray)
+        else:
+            boxes = self.boxes
+        self.frames += 1
+        self.boxes = boxes
+        return boxes
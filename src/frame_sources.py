@@ -0,0 +1,117 @@
+import glob
+import os
+import time
+import cv2
+from pathlib import Path
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class CaptureSource:
+    """Webcam index, video file or stream URL read through cv2.VideoCapture"""
+
+    def __init__(self, spec=0):
+        self.spec = spec
+        self.cap = cv2.VideoCapture(spec)
+        # Recorded inputs are replayed losslessly; live inputs may drop stale frames
+        self.live = isinstance(spec, int) or '://' in str(spec)
+        if self.live:
+            # Keep the driver from queueing stale frames behind a slow consumer
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.last_tag = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource:
+    """Replay a directory (or glob such as 'face_data/person*') of images as frames.
+
+    `last_tag` holds the name of the directory the last frame came from, so
+    replays of face_data/person*/ carry their ground-truth identity.
+    """
+
+    live = False
+
+    def __init__(self, pattern):
+        pattern = str(pattern)
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '**', '*')
+        self.paths = sorted(p for p in glob.glob(pattern, recursive=True)
+                            if p.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.paths:
+            # A glob of directories: take every image inside them
+            self.paths = sorted(str(p) for d in sorted(glob.glob(pattern)) if os.path.isdir(d)
+                                for p in Path(d).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        self.index = 0
+        self.last_tag = None
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        while self.index < len(self.paths):
+            path = self.paths[self.index]
+            self.index += 1
+            frame = cv2.imread(path)
+            if frame is not None:
+                self.last_tag = Path(path).parent.name
+                return True, frame
+        return False, None
+
+    def release(self):
+        self.index = len(self.paths)
+
+
+class LimitedSource:
+    """Stop another source after max_frames frames or duration seconds"""
+
+    def __init__(self, source, max_frames=None, duration=None):
+        self.source = source
+        self.live = source.live
+        self.max_frames = max_frames
+        self.duration = duration
+        self.frames = 0
+        self.started = None
+
+    @property
+    def last_tag(self):
+        return self.source.last_tag
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def read(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+        if self.max_frames is not None and self.frames >= self.max_frames:
+            return False, None
+        if self.duration is not None and time.perf_counter() - self.started >= self.duration:
+            return False, None
+        self.frames += 1
+        return self.source.read()
+
+    def release(self):
+        self.source.release()
+
+
+def open_frame_source(source=0, max_frames=None, duration=None):
+    """Open a frame source from a camera index, video path, URL or image directory/glob"""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+
+    if isinstance(source, str) and '://' not in source and (
+            os.path.isdir(source) or any(c in source for c in '*?[')):
+        frame_source = ImageDirectorySource(source)
+    else:
+        frame_source = CaptureSource(source)
+
+    if max_frames is not None or duration is not None:
+        frame_source = LimitedSource(frame_source, max_frames, duration)
+    return frame_source
@@ -0,0 +1,213 @@
+import os
+import time
+import threading
+import cv2
+import numpy as np
+
+
+class BatchPredictor:
+    """Classify every face crop of one or more frames with a single forward pass"""
+
+    def __init__(self, model, img_size=(92, 112), capacity=32):
+        import tensorflow as tf
+
+        self.model = model
+        self.img_size = img_size  # (width, height) as used by cv2.resize
+        self.buffer = np.empty((capacity, img_size[1], img_size[0], 1), dtype=np.float32)
+
+        # One traced graph for every batch size instead of Keras' predict() dispatch
+        self._forward = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec([None, img_size[1], img_size[0], 1], tf.float32)]
+        )
+
+        self.frames = 0
+        self.faces = 0
+        self.elapsed = 0.0
+        # The buffer is reused by every call, and cached predictors may be shared
+        self._lock = threading.Lock()
+
+    def _ensure_capacity(self, n):
+        """Grow the preallocated input tensor when a batch does not fit"""
+        capacity = len(self.buffer)
+        if n <= capacity:
+            return
+        while capacity < n:
+            capacity *= 2
+        self.buffer = np.empty((capacity,) + self.buffer.shape[1:], dtype=np.float32)
+
+    def _fill(self, gray, faces, offset):
+        """Resize and normalise the face crops of one frame into the input tensor"""
+        for i, (x, y, w, h) in enumerate(faces):
+            face = cv2.resize(gray[y:y+h, x:x+w], self.img_size)
+            np.multiply(face, 1.0 / 255.0, out=self.buffer[offset + i, :, :, 0], casting='unsafe')
+        return offset + len(faces)
+
+    def predict_frames(self, frames):
+        """Predict all faces of several frames at once.
+
+        `frames` is a list of (gray, faces) tuples; returns one array of
+        class probabilities per frame, in the same order.
+        """
+        with self._lock:
+            return self._predict_frames(frames)
+
+    def _predict_frames(self, frames):
+        total = sum(len(faces) for _, faces in frames)
+        start = time.perf_counter()
+
+        if total == 0:
+            results = [np.empty((0,)) for _ in frames]
+        else:
+            self._ensure_capacity(total)
+            offset = 0
+            for gray, faces in frames:
+                offset = self._fill(gray, faces, offset)
+
+            predictions = self._run(self.buffer[:total])
+
+            results, offset = [], 0
+            for _, faces in frames:
+                results.append(predictions[offset:offset + len(faces)])
+                offset += len(faces)
+
+        self.elapsed += time.perf_counter() - start
+        self.frames += len(frames)
+        self.faces += total
+        return results
+
+    def _run(self, x):
+        return self._forward(x).numpy().astype(np.float32)
+
+    def predict(self, gray, faces):
+        """Predict all faces of a single frame"""
+        return self.predict_frames([(gray, faces)])[0]
+
+    def warmup(self):
+        """Trace the graph once so the first real frame doesn't pay for it"""
+        with self._lock:
+            self._forward(self.buffer[:1])
+
+    def report(self, reset=True):
+        """Print per-frame inference latency and face throughput"""
+        if self.frames:
+            latency_ms = 1000.0 * self.elapsed / self.frames
+            faces_per_sec = self.faces / self.elapsed if self.elapsed > 0 else 0.0
+            print(f"[INFERENCE] {self.frames} frames, {self.faces} faces: "
+                  f"{latency_ms:.1f} ms/frame, {faces_per_sec:.1f} faces/s")
+        if reset:
+            self.frames, self.faces, self.elapsed = 0, 0, 0.0
+
+
+def is_tflite_model(model_path):
+    return str(model_path).lower().endswith('.tflite')
+
+
+def load_interpreter(model_path, num_threads=None):
+    """Open a .tflite model with the lightest interpreter that is installed.
+
+    LiteRT (ai-edge-litert) and tflite-runtime are small wheels without the
+    rest of TensorFlow; tf.lite is only the fallback.
+    """
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=str(model_path), num_threads=num_threads)
+
+
+class TFLitePredictor(BatchPredictor):
+    """BatchPredictor running an exported .tflite model (see model_export.py).
+
+    The interpreter's input is resized to the batch size only when it
+    changes, so steady single-face traffic never reallocates tensors.
+    """
+
+    def __init__(self, model_path, img_size=(92, 112), capacity=32, num_threads=None):
+        self.model = None  # no Keras model, so no embedding extraction
+        self.model_path = str(model_path)
+        self.img_size = img_size
+        self.buffer = np.empty((capacity, img_size[1], img_size[0], 1), dtype=np.float32)
+
+        self.interpreter = load_interpreter(model_path, num_threads)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+
+        self.frames = 0
+        self.faces = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def _run(self, x):
+        if self._batch_size != len(x):
+            self.interpreter.resize_tensor_input(self._input['index'], x.shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = len(x)
+
+        scale, zero_point = self._input['quantization']
+        if self._input['dtype'] != np.float32:
+            # Fully integer models take quantized input
+            x = np.round(x / scale + zero_point).astype(self._input['dtype'])
+        self.interpreter.set_tensor(self._input['index'], x)
+        self.interpreter.invoke()
+        predictions = self.interpreter.get_tensor(self._output['index'])
+
+        scale, zero_point = self._output['quantization']
+        if self._output['dtype'] != np.float32:
+            predictions = (predictions.astype(np.float32) - zero_point) * scale
+        return predictions.astype(np.float32)
+
+    def warmup(self):
+        with self._lock:
+            self._run(self.buffer[:1])
+
+
+# Process-wide cache of warmed-up predictors: (path, img_size, embedding) -> (file signature, predictor)
+_predictor_cache = {}
+_predictor_cache_lock = threading.Lock()
+
+
+def load_predictor(model_path, img_size=(92, 112), embedding=False):
+    """Load a model into a warmed-up predictor, reusing it until the file changes.
+
+    Predictors are cached per process, keyed by model path and checked
+    against the file's mtime and size, so repeated "Start Recognition"
+    requests skip both the load and the first-predict graph tracing.
+    With embedding=True the classifier's trunk is used (see embeddings.py).
+    TensorFlow is only imported here, on the first Keras model load.
+    """
+    path = os.path.abspath(str(model_path))
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    key = (path, tuple(img_size), embedding)
+
+    with _predictor_cache_lock:
+        cached = _predictor_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        start = time.perf_counter()
+        if is_tflite_model(path):
+            if embedding:
+                raise ValueError("Embedding search needs the Keras model, not a .tflite export")
+            predictor = TFLitePredictor(path, img_size)
+        else:
+            from tensorflow.keras.models import load_model
+            model = load_model(path)
+            if embedding:
+                from embeddings import create_embedding_model
+                model = create_embedding_model(model)
+            predictor = BatchPredictor(model, img_size)
+        loaded = time.perf_counter()
+        predictor.warmup()
+        warm = time.perf_counter()
+
+        print(f"[STARTUP] {'Reloaded' if cached is not None else 'Loaded'} {model_path}: "
+              f"load {loaded - start:.2f}s, warm-up {warm - loaded:.2f}s")
+        _predictor_cache[key] = (signature, predictor)
+        return predictor
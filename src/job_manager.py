@@ -0,0 +1,173 @@
+import collections
+import itertools
+import threading
+import time
+import traceback
+
+from metrics import registry
+
+JOBS = registry.counter('jobs_total', 'Finished background jobs', ['kind', 'status'])
+JOBS_ACTIVE = registry.gauge('jobs_active', 'Queued or running background jobs', ['kind'])
+JOB_SECONDS = registry.histogram('job_duration_seconds', 'Run time of background jobs', ['kind'],
+                                 buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200))
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's target to end it as cancelled"""
+
+
+class Job:
+    """A background task with status, progress and cooperative cancellation.
+
+    The target receives the job and reports through `update(progress, **info)`;
+    it should check `cancelled()` regularly and stop (or raise JobCancelled)
+    once it returns True.
+    """
+
+    def __init__(self, job_id, kind, key, target, params):
+        self.job_id = job_id
+        self.kind = kind
+        self.key = key
+        self.target = target
+        self.params = params
+        self.status = 'queued'
+        self.progress = 0.0
+        self.info = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def update(self, progress=None, **info):
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, float(progress)))
+        self.info.update(info)
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def sleep(self, seconds):
+        """Wait up to `seconds`, returning early (True) if the job is cancelled"""
+        return self._cancel.wait(seconds)
+
+    def done(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.done()
+
+    def to_dict(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 2)
+        return {
+            'jobId': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'elapsed': elapsed,
+            'error': self.error,
+            'result': self.result,
+            **self.info,
+        }
+
+
+class JobManager:
+    """Run jobs in background threads with IDs, status and single-flight per key.
+
+    Jobs sharing a `key` (e.g. the dataset a training job writes) run one
+    at a time in submission order; a later job waits in 'queued'. Submitting
+    the same kind, key and parameters as a job that is still queued or
+    running returns that job instead of starting a duplicate.
+    """
+
+    def __init__(self, history=100):
+        self.jobs = collections.OrderedDict()
+        self.history = history
+        self._ids = itertools.count(1)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, target, key=None, **params):
+        with self._lock:
+            for job in self.jobs.values():
+                if (job.kind, job.key, job.params) == (kind, key, params) and not job.done():
+                    return job
+            job = Job(f"{kind}-{next(self._ids)}", kind, key, target, params)
+            self.jobs[job.job_id] = job
+            key_lock = self._key_locks.setdefault(key, threading.Lock()) if key is not None else None
+            self._prune()
+
+        JOBS_ACTIVE.labels(kind).inc()
+        job._thread = threading.Thread(target=self._run, args=(job, key_lock), name=f"job-{job.job_id}",
+                                       daemon=True)
+        job._thread.start()
+        return job
+
+    def _run(self, job, key_lock):
+        acquired = False
+        if key_lock is not None:
+            # Wait for earlier jobs with the same key, but give up if cancelled meanwhile
+            while not job.cancelled():
+                if key_lock.acquire(timeout=0.5):
+                    acquired = True
+                    break
+        try:
+            if job.cancelled():
+                job.status = 'cancelled'
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+            print(f"[JOB] {job.job_id} started")
+            job.result = job.target(job, **job.params)
+            job.status = 'cancelled' if job.cancelled() else 'succeeded'
+            if job.status == 'succeeded':
+                job.progress = 1.0
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+            if acquired:
+                key_lock.release()
+            JOBS_ACTIVE.labels(job.kind).dec()
+            JOBS.labels(job.kind, job.status).inc()
+            if job.started_at is not None:
+                JOB_SECONDS.labels(job.kind).observe(job.finished_at - job.started_at)
+            print(f"[JOB] {job.job_id} {job.status}")
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond `history`"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.done()]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self, kind=None):
+        return [job.to_dict() for job in list(self.jobs.values()) if kind is None or job.kind == kind]
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
@@ -0,0 +1,144 @@
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from pathlib import Path
+
+import dataset_store
+from inference import BatchPredictor, TFLitePredictor
+
+QUANTIZE_MODES = ('none', 'float16', 'int8')
+
+
+def default_tflite_path(model_path, quantize=None):
+    suffix = f"_{quantize}" if quantize and quantize != 'none' else ''
+    return str(Path(model_path).with_suffix('')) + suffix + '.tflite'
+
+
+def representative_dataset(dataset_path='face_dataset.npz', samples=200, seed=0):
+    """Calibration batches for INT8 quantization, drawn from the training split"""
+    images, _, train_idx = dataset_store.open_dataset(dataset_path).split('train')
+    rng = np.random.default_rng(seed)
+    chosen = np.sort(rng.choice(train_idx, min(samples, len(train_idx)), replace=False))
+
+    def generate():
+        for i in chosen:
+            x = images[np.array([i])].astype(np.float32) / 255.0
+            yield [x.reshape(x.shape + (1,))]
+    return generate
+
+
+def export_tflite(model, output_path, quantize=None, dataset_path='face_dataset.npz', calibration_samples=200):
+    """Convert a Keras model to .tflite; quantize is None/'none', 'float16' or 'int8'.
+
+    INT8 uses post-training quantization of weights and activations,
+    calibrated on images of the dataset; input and output stay float32 so
+    recognition code is unchanged.
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == 'int8':
+        if not os.path.exists(dataset_path):
+            raise FileNotFoundError(f"INT8 calibration needs the dataset at {dataset_path}")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(dataset_path, calibration_samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif quantize not in (None, 'none'):
+        raise ValueError(f"Unknown quantization '{quantize}'")
+
+    start = time.perf_counter()
+    tflite_model = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+    print(f"Exported {output_path} ({len(tflite_model) / 1e6:.1f} MB, quantize={quantize or 'none'}) "
+          f"in {time.perf_counter() - start:.1f}s")
+    return output_path
+
+
+def _benchmark(predictor, x, labels, batch_size=32, single_runs=50):
+    """Accuracy over x plus single-face and batched latency of one predictor"""
+    predictions = np.concatenate([predictor._run(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+    accuracy = float(np.mean(np.argmax(predictions, axis=1) == labels))
+
+    predictor._run(x[:1])
+    start = time.perf_counter()
+    for i in range(single_runs):
+        predictor._run(x[i % len(x):i % len(x) + 1])
+    single_ms = 1000.0 * (time.perf_counter() - start) / single_runs
+
+    batch = x[:batch_size]
+    predictor._run(batch)
+    start = time.perf_counter()
+    for _ in range(5):
+        predictor._run(batch)
+    batch_ms = 1000.0 * (time.perf_counter() - start) / (5 * len(batch))
+    return predictions, accuracy, single_ms, batch_ms
+
+
+def compare_models(model, tflite_path, dataset_path='face_dataset.npz', img_size=(92, 112), model_path=None):
+    """Print test accuracy and latency of the Keras model next to its .tflite export"""
+    images, labels, test_idx = dataset_store.open_dataset(dataset_path).split('test')
+    if len(test_idx) == 0:
+        print("No test images to compare the exported model on")
+        return None
+    test_idx = np.sort(test_idx)
+    x = images[test_idx].astype(np.float32) / 255.0
+    x = x.reshape(x.shape + (1,))
+    y = labels[test_idx]
+
+    keras_pred, keras_acc, keras_single, keras_batch = _benchmark(BatchPredictor(model, img_size), x, y)
+    lite_pred, lite_acc, lite_single, lite_batch = _benchmark(TFLitePredictor(tflite_path, img_size), x, y)
+    agreement = float(np.mean(np.argmax(keras_pred, axis=1) == np.argmax(lite_pred, axis=1)))
+
+    keras_size = os.path.getsize(model_path) / 1e6 if model_path and os.path.exists(model_path) else float('nan')
+    print(f"[EXPORT] {len(y)} test images")
+    print(f"[EXPORT] {'backend':<8} {'accuracy':>8} {'1 face ms':>10} {'batched ms/face':>16} {'size MB':>8}")
+    print(f"[EXPORT] {'keras':<8} {keras_acc:>8.4f} {keras_single:>10.2f} {keras_batch:>16.2f} {keras_size:>8.1f}")
+    print(f"[EXPORT] {'tflite':<8} {lite_acc:>8.4f} {lite_single:>10.2f} {lite_batch:>16.2f} "
+          f"{os.path.getsize(tflite_path) / 1e6:>8.1f}")
+    print(f"[EXPORT] top-1 agreement with the Keras model: {agreement:.4f}")
+    return {
+        'keras': {'accuracy': keras_acc, 'single_ms': keras_single, 'batch_ms_per_face': keras_batch},
+        'tflite': {'accuracy': lite_acc, 'single_ms': lite_single, 'batch_ms_per_face': lite_batch},
+        'agreement': agreement,
+    }
+
+
+def export_model(model_path='face_recognition_model.h5', output_path=None, quantize=None,
+                 dataset_path='face_dataset.npz', compare=True, model=None, calibration_samples=200):
+    """Export a trained model (loaded from model_path unless given) and compare it with the original"""
+    if model is None:
+        from tensorflow.keras.models import load_model
+        model = load_model(model_path)
+    output_path = output_path or default_tflite_path(model_path, quantize)
+    export_tflite(model, output_path, quantize, dataset_path, calibration_samples)
+    if compare and os.path.exists(dataset_path):
+        compare_models(model, output_path, dataset_path, model_path=model_path)
+    return output_path
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Export the face recognition model to TFLite')
+    parser.add_argument('--model', dest='model_path', default='face_recognition_model.h5',
+                        help='Trained Keras model (default: face_recognition_model.h5)')
+    parser.add_argument('--output', dest='output_path',
+                        help='Output .tflite path (default: next to the model)')
+    parser.add_argument('--quantize', choices=QUANTIZE_MODES, default='none',
+                        help='Post-training quantization (default: none)')
+    parser.add_argument('--dataset', dest='dataset_path', default='face_dataset.npz',
+                        help='Dataset used for INT8 calibration and the comparison (default: face_dataset.npz)')
+    parser.add_argument('--calibration-samples', dest='calibration_samples', type=int, default=200,
+                        help='Images used to calibrate INT8 activations (default: 200)')
+    parser.add_argument('--no-compare', dest='compare', action='store_false',
+                        help='Skip the accuracy/latency comparison')
+    args = parser.parse_args()
+
+    export_model(args.model_path, args.output_path, args.quantize, args.dataset_path, args.compare,
+                 calibration_samples=args.calibration_samples)
+
+
+if __name__ == "__main__":
+    main()
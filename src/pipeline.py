@@ -0,0 +1,418 @@
+import collections
+import queue
+import threading
+import time
+import cv2
+
+from metrics import registry
+
+FRAMES = registry.counter('recognition_frames_total', 'Frames fully processed', ['location'])
+FRAMES_DROPPED = registry.counter('recognition_frames_dropped_total',
+                                  'Frames dropped under load, by queue', ['location', 'queue'])
+FACES = registry.counter('recognition_faces_total', 'Faces detected', ['location'])
+PREDICTIONS = registry.counter('recognition_predictions_total', 'Faces sent to the model', ['location'])
+EVENTS_LOGGED = registry.counter('recognition_events_logged_total', 'Recognition events logged', ['location'])
+ERRORS = registry.counter('recognition_errors_total', 'Frames lost to an exception, by stage',
+                          ['location', 'stage'])
+STAGE_SECONDS = registry.histogram('recognition_stage_seconds',
+                                   'Time per frame in each pipeline stage (end_to_end: capture to result)',
+                                   ['location', 'stage'])
+
+
+class StageMetrics:
+    """The metric children of one pipeline, bound once so the hot path skips the label lookup"""
+
+    def __init__(self, location):
+        self.frames = FRAMES.labels(location)
+        self.dropped_capture = FRAMES_DROPPED.labels(location, 'capture')
+        self.dropped_inference = FRAMES_DROPPED.labels(location, 'inference')
+        self.faces = FACES.labels(location)
+        self.predictions = PREDICTIONS.labels(location)
+        self.events = EVENTS_LOGGED.labels(location)
+        self.inference_errors = ERRORS.labels(location, 'inference')
+        self.postprocess_errors = ERRORS.labels(location, 'postprocess')
+        self.detect_errors = ERRORS.labels(location, 'detect')
+        self.log_errors = ERRORS.labels(location, 'log')
+        for stage in ('capture', 'detect', 'inference', 'postprocess', 'log', 'end_to_end'):
+            setattr(self, stage, STAGE_SECONDS.labels(location, stage))
+
+
+class DropOldestQueue:
+    """Bounded queue that discards its oldest item instead of blocking the producer.
+
+    With block=True it behaves like a plain bounded queue instead, which is
+    what lossless replays of recorded input need. `put(block=...)` overrides
+    this per item, so a queue shared by live and recorded streams only ever
+    drops items that were put without blocking.
+    """
+
+    def __init__(self, maxsize, block=False, on_drop=None):
+        self.maxsize = maxsize
+        self._items = collections.deque()  # (item, droppable)
+        self._cond = threading.Condition()
+        self.block = block
+        self.on_drop = on_drop
+        self.dropped = 0
+
+    def put(self, item, timeout=None, block=None):
+        """Enqueue item; returns False only if a blocking put timed out"""
+        block = self.block if block is None else block
+        with self._cond:
+            if block:
+                if not self._cond.wait_for(lambda: len(self._items) < self.maxsize, timeout):
+                    return False
+            elif len(self._items) >= self.maxsize:
+                victim = next((i for i, (_, droppable) in enumerate(self._items) if droppable), None)
+                if victim is None:
+                    # Only items that must not be dropped are queued: drop the new one
+                    victim_item = item
+                else:
+                    victim_item = self._items[victim][0]
+                    del self._items[victim]
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop(victim_item)
+                if victim is None:
+                    return True
+            self._items.append((item, not block))
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            item = self._items.popleft()[0]
+            self._cond.notify_all()
+            return item
+
+    def get_batch(self, max_items, timeout=None):
+        """Wait for at least one item, then take up to max_items without waiting"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return []
+            batch = []
+            while self._items and len(batch) < max_items:
+                batch.append(self._items.popleft()[0])
+            self._cond.notify_all()
+            return batch
+
+    def __len__(self):
+        return len(self._items)
+
+
+class FramePacket:
+    """A captured frame and everything later stages learn about it"""
+
+    __slots__ = ('seq', 'tag', 'stream', 'captured_at', 'frame', 'gray', 'faces', 'track_ids', 'infer',
+                 'predictions', 'labels')
+
+    def __init__(self, seq, frame, tag=None, stream=None):
+        self.seq = seq
+        self.tag = tag
+        self.stream = stream
+        self.captured_at = time.perf_counter()
+        self.frame = frame
+        self.gray = None
+        self.faces = ()
+        self.track_ids = None  # per-face track IDs, if the detector tracks faces
+        self.infer = None      # per-face mask of faces to classify; None means all
+        self.predictions = ()
+        self.labels = []
+
+    def faces_to_predict(self):
+        if self.infer is None:
+            return self.faces
+        return [face for face, predict in zip(self.faces, self.infer) if predict]
+
+
+class InferenceBatcher:
+    """Inference stage: batches detected frames from one or more pipelines into single forward passes.
+
+    Every packet carries the pipeline it came from in `packet.stream`; after
+    prediction the packet is handed back through `stream.deliver(packet)`.
+    One batcher can be shared by many pipelines so faces from several
+    cameras end up in the same batch. A batch that fails is logged and its
+    packets are discarded, so one bad frame never stops the shared thread.
+    """
+
+    def __init__(self, predictor, max_batch_frames=4, queue_size=8, block=False):
+        self.predictor = predictor
+        self.max_batch_frames = max(1, max_batch_frames)
+        self.queue = DropOldestQueue(queue_size, block=block,
+                                     on_drop=lambda packet: packet.stream.discard(packet))
+        self.stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self.stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, name="recognition-infer", daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            batch = self.queue.get_batch(self.max_batch_frames, timeout=0.1)
+            if not batch:
+                continue
+
+            # One forward pass for the faces of every frame in the batch
+            faces = [p.faces_to_predict() for p in batch]
+            start = time.perf_counter()
+            try:
+                predictions = self.predictor.predict_frames([(p.gray, f) for p, f in zip(batch, faces)])
+            except Exception as e:
+                print(f"Error: inference failed for a batch of {len(batch)} frames, dropping it: {e!r}")
+                for packet in batch:
+                    packet.stream.metrics.inference_errors.inc()
+                    packet.stream.discard(packet)
+                continue
+            elapsed = time.perf_counter() - start
+            for packet, frame_faces in zip(batch, faces):
+                packet.stream.metrics.inference.observe(elapsed)
+                packet.stream.metrics.predictions.inc(len(frame_faces))
+            for packet, frame_predictions in zip(batch, predictions):
+                packet.predictions = frame_predictions
+                try:
+                    packet.stream.deliver(packet)
+                except Exception as e:
+                    print(f"Error: could not process the results of frame {packet.seq}, dropping it: {e!r}")
+                    packet.stream.metrics.postprocess_errors.inc()
+                    packet.stream.discard(packet)
+
+    def stop(self):
+        self.stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+
+class RecognitionPipeline:
+    """Capture -> detection workers -> inference batcher -> logger, connected by bounded queues.
+
+    `make_detector()` is called once per detection worker and must return a
+    callable mapping a grayscale frame to face boxes. `postprocess(packet)` runs
+    on the batcher thread after prediction and returns the log events for that
+    frame, which are handed to `log_event(event)` on the logger thread.
+    Finished packets are published on `results` for display.
+
+    Pass a shared `batcher` to batch inference with other pipelines; otherwise
+    the pipeline runs a private InferenceBatcher around `predictor`.
+
+    `select(packet)`, if given, runs on the detection worker after detection
+    and may set `packet.infer` so only some faces are classified. Detectors
+    that track faces expose `track_ids`, which is copied to the packet.
+
+    Frames are dropped under load only for live sources; recorded sources
+    (cap.live is False) apply back-pressure so every frame is processed,
+    also when the batcher is shared with live cameras.
+
+    Counters and per-stage latency histograms are recorded under `location`
+    in metrics.registry.
+    """
+
+    def __init__(self, cap, predictor, make_detector, postprocess, log_event,
+                 detection_workers=2, queue_size=4, max_batch_frames=4, batcher=None, select=None,
+                 location='Unknown'):
+        self.cap = cap
+        self.make_detector = make_detector
+        self.postprocess = postprocess
+        self.log_event = log_event
+        self.select = select
+        self.detection_workers = max(1, detection_workers)
+        self.metrics = StageMetrics(location)
+
+        self.lossless = not getattr(cap, 'live', True)
+        self.owns_batcher = batcher is None
+        if self.owns_batcher:
+            batcher = InferenceBatcher(predictor, max_batch_frames, queue_size, block=self.lossless)
+        self.batcher = batcher
+
+        self.frames = DropOldestQueue(queue_size, block=self.lossless,
+                                      on_drop=lambda packet: self.metrics.dropped_capture.inc())
+        # Display only ever wants the newest frame, so results are always dropped
+        self.results = DropOldestQueue(queue_size)
+        self.events = queue.Queue()
+
+        self.stop_event = threading.Event()
+        self.capture_done = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._detectors_active = self.detection_workers
+
+        self.frames_captured = 0
+        self.frames_submitted = 0
+        self.frames_processed = 0
+        self.frames_discarded = 0
+        self.latency_total = 0.0
+        self.started_at = None
+        self.first_frame_ms = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        if self.owns_batcher:
+            self.batcher.start()
+        self._spawn(self._capture_loop, "capture")
+        for i in range(self.detection_workers):
+            self._spawn(self._detect_loop, f"detect-{i}")
+        self._spawn(self._log_loop, "logger")
+        return self
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=f"recognition-{name}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _put(self, target, item, block=None):
+        # Blocking queues wait for space, but never past a stop request
+        while not target.put(item, timeout=0.1, block=block):
+            if self.stop_event.is_set():
+                return False
+        return True
+
+    def running(self):
+        return not self.stop_event.is_set()
+
+    def _capture_loop(self):
+        seq = 0
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            self.metrics.capture.observe(time.perf_counter() - start)
+            if not ret:
+                if getattr(self.cap, 'live', True):
+                    print("Error: Failed to grab frame")
+                else:
+                    print("End of input reached")
+                break
+            self._put(self.frames, FramePacket(seq, frame, getattr(self.cap, 'last_tag', None), self))
+            self.frames_captured += 1
+            seq += 1
+        self.capture_done.set()
+
+    def _detect_loop(self):
+        try:
+            detect = self.make_detector()
+            while not self.stop_event.is_set():
+                try:
+                    packet = self.frames.get(timeout=0.1)
+                except queue.Empty:
+                    if self.capture_done.is_set() and len(self.frames) == 0:
+                        break
+                    continue
+                try:
+                    self._detect(detect, packet)
+                except Exception as e:
+                    # The frame was never submitted, so dropping it keeps the counts balanced
+                    print(f"Error: face detection failed on frame {packet.seq}, dropping it: {e!r}")
+                    self.metrics.detect_errors.inc()
+                    continue
+                with self._lock:
+                    self.frames_submitted += 1
+                # A shared batcher may serve live cameras too; this stream's frames keep its own mode
+                if not self._put(self.batcher.queue, packet, block=self.lossless):
+                    self.discard(packet)
+        except Exception as e:
+            print(f"Error: detection worker stopped: {e!r}")
+            self.metrics.detect_errors.inc()
+        finally:
+            # Always count this worker out, or _check_finished could never end the run
+            with self._lock:
+                self._detectors_active -= 1
+            self._check_finished()
+
+    def _detect(self, detect, packet):
+        start = time.perf_counter()
+        packet.gray = cv2.cvtColor(packet.frame, cv2.COLOR_BGR2GRAY)
+        packet.faces = detect(packet.gray)
+        self.metrics.detect.observe(time.perf_counter() - start)
+        self.metrics.faces.inc(len(packet.faces))
+        track_ids = getattr(detect, 'track_ids', None)
+        if track_ids is not None:
+            packet.track_ids = list(track_ids)
+        if self.select is not None:
+            self.select(packet)
+
+    def _check_finished(self):
+        """Stop once input is exhausted and every submitted frame came back"""
+        with self._lock:
+            finished = (self._detectors_active == 0 and
+                        self.frames_submitted == self.frames_processed + self.frames_discarded)
+        if finished:
+            self.stop_event.set()
+
+    def deliver(self, packet):
+        """Called by the batcher once the packet's faces have been predicted"""
+        start = time.perf_counter()
+        for event in self.postprocess(packet):
+            self.events.put(event)
+        with self._lock:
+            now = time.perf_counter()
+            self.metrics.postprocess.observe(now - start)
+            self.metrics.end_to_end.observe(now - packet.captured_at)
+            self.metrics.frames.inc()
+            self.latency_total += now - packet.captured_at
+            self.frames_processed += 1
+            first = self.first_frame_ms is None
+            if first:
+                self.first_frame_ms = 1000.0 * (now - self.started_at)
+        if first:
+            print(f"[STARTUP] First frame recognised {self.first_frame_ms:.0f} ms after the pipeline started")
+        self.results.put(packet)
+        self._check_finished()
+
+    def discard(self, packet):
+        """Called when the batcher drops a packet of this pipeline under load"""
+        with self._lock:
+            self.frames_discarded += 1
+        self.metrics.dropped_inference.inc()
+        self._check_finished()
+
+    def _log_loop(self):
+        # Keep draining after stop so no recognition event is lost
+        while True:
+            try:
+                event = self.events.get(timeout=0.1)
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    break
+                continue
+            start = time.perf_counter()
+            try:
+                self.log_event(event)
+            except Exception as e:
+                # One bad event must not stop logging for the rest of the run
+                print(f"Error: could not log recognition event, dropping it: {e!r}")
+                self.metrics.log_errors.inc()
+                continue
+            self.metrics.log.observe(time.perf_counter() - start)
+            self.metrics.events.inc()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        if self.owns_batcher:
+            self.batcher.stop()
+
+    def stats(self):
+        """Throughput, end-to-end latency and drop counters of this pipeline"""
+        with self._lock:
+            processed = self.frames_processed
+            latency_ms = 1000.0 * self.latency_total / processed if processed else 0.0
+            return {
+                'captured': self.frames_captured,
+                'processed': processed,
+                'latency_ms': round(latency_ms, 1),
+                'first_frame_ms': round(self.first_frame_ms, 1) if self.first_frame_ms is not None else None,
+                'dropped_capture': self.frames.dropped,
+                'dropped_inference': self.frames_discarded,
+                'dropped_display': self.results.dropped,
+            }
+
+    def report(self):
+        """Print throughput, end-to-end latency and frames dropped by each queue"""
+        stats = self.stats()
+        print(f"[PIPELINE] captured={stats['captured']} processed={stats['processed']} "
+              f"latency={stats['latency_ms']:.1f} ms dropped(capture={stats['dropped_capture']}, "
+              f"inference={stats['dropped_inference']}, display={stats['dropped_display']})")
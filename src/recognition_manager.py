@@ -0,0 +1,207 @@
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from inference import load_predictor
+from pipeline import InferenceBatcher, RecognitionPipeline
+from frame_sources import open_frame_source
+from track_voting import TrackVoter
+from attendance_log import get_log_writer
+from recognizing import (load_person_names, load_label_map, initialize_csv, make_face_detector,
+                         make_frame_handlers, make_softmax_identifier,
+                         make_embedding_identifier, detection_workers_for, run_pipeline, summarize)
+
+
+class RecognitionStream:
+    """One camera stream (and its location) served by a RecognitionManager"""
+
+    def __init__(self, stream_id, location, source, cap, pipeline, counts,
+                 confidence_threshold, headless, csv_path=None, db_path=None):
+        self.stream_id = stream_id
+        self.location = location
+        self.source = source
+        self.cap = cap
+        self.pipeline = pipeline
+        self.counts = counts
+        self.confidence_threshold = confidence_threshold
+        self.headless = headless
+        self.csv_path = csv_path
+        self.db_path = db_path
+        self.started_at = time.time()
+        self.finished_at = None
+        self.summary = None
+        self._thread = None
+
+    def start(self):
+        self.pipeline.start()
+        self._thread = threading.Thread(target=self._run, name=f"stream-{self.stream_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        elapsed = run_pipeline(self.pipeline, self.confidence_threshold, headless=self.headless,
+                               window_name=f"Face Recognition - {self.location}")
+        self.cap.release()
+        if self.csv_path and not get_log_writer(self.csv_path, self.db_path).flush():
+            print(f"[{self.stream_id}] Warning: not every recognition reached {self.csv_path}")
+        self.summary = summarize(self.pipeline, self.counts, elapsed)
+        self.finished_at = time.time()
+        print(f"[{self.stream_id}] Recognition at '{self.location}' stopped: {self.summary}")
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self, timeout=5):
+        self.pipeline.stop()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        stats = self.pipeline.stats()
+        return {
+            'streamId': self.stream_id,
+            'location': self.location,
+            'source': str(self.source),
+            'running': self.running(),
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'fps': round(stats['processed'] / elapsed, 2) if elapsed > 0 else 0.0,
+            'faces': self.counts['faces'],
+            'classified': self.counts['classified'],
+            'accuracy': (round(self.counts['correct'] / self.counts['scored'], 4)
+                         if self.counts['scored'] else None),
+            **stats,
+        }
+
+
+class RecognitionManager:
+    """Serve many camera streams from one process with a single shared model.
+
+    The model is loaded once; every stream runs its own capture and detection
+    stages but all of them feed one InferenceBatcher, so faces from different
+    cameras are classified in the same forward pass.
+
+    With `index_path` the model's trunk is used as an embedding extractor and
+    faces are matched against an EmbeddingIndex, which `enroll()` can extend
+    while streams are running.
+    """
+
+    def __init__(self, model_path='face_recognition_model.h5', img_size=(92, 112),
+                 max_batch_frames=8, detection_workers=2, index_path=None):
+        self.model_path = str(model_path)
+        self.index_path = index_path
+        self.index = None
+        self.img_size = img_size
+        self.max_batch_frames = max_batch_frames
+        self.detection_workers = detection_workers
+        self.predictor = None
+        self.batcher = None
+        self.streams = {}
+        self._lock = threading.Lock()
+
+    def _ensure_model(self):
+        """Get the (cached, warmed-up) model and start the shared batcher.
+
+        Called for every new stream: if the model file was retrained since it
+        was loaded, the new model is swapped into the running batcher.
+        """
+        if not Path(self.model_path).exists():
+            raise FileNotFoundError(f"Model file {self.model_path} not found")
+        predictor = load_predictor(self.model_path, self.img_size, embedding=bool(self.index_path))
+        if self.index_path and self.index is None:
+            from embeddings import EmbeddingIndex
+            self.index = EmbeddingIndex(self.index_path)
+        if predictor is not self.predictor:
+            self.predictor = predictor
+            if self.batcher is not None:
+                self.batcher.predictor = predictor
+        if self.batcher is None:
+            self.batcher = InferenceBatcher(self.predictor, self.max_batch_frames,
+                                            queue_size=4 * self.max_batch_frames)
+        self.batcher.start()
+
+    def start_stream(self, location, source=0, confidence_threshold=0.5, stream_id=None,
+                     names_path='label_names.json', csv_path='recognition_log.csv',
+                     headless=True, max_frames=None, duration=None,
+                     detect_scale=1.0, detect_interval=1, tracker='iou', track_votes=0,
+                     db_path='attendance.db', dataset_path='face_dataset.npz'):
+        """Start recognition on a new stream and return it.
+
+        detect_scale/detect_interval/tracker set this camera's detection
+        cost (see face_detection.FaceDetector); track_votes > 0 classifies
+        each face track once (see track_voting.TrackVoter). Softmax outputs
+        are logged as person IDs through `dataset_path`'s label map, which
+        also scores replays of face_data/person*/ directories.
+        """
+        with self._lock:
+            stream_id = str(stream_id or uuid.uuid4().hex[:8])
+            existing = self.streams.get(stream_id)
+            if existing is not None and existing.running():
+                raise ValueError(f"Stream {stream_id} is already running")
+
+            self._ensure_model()
+            csv_path = initialize_csv(csv_path)
+            get_log_writer(csv_path, db_path)  # ValueError if the log already feeds another store
+
+            cap = open_frame_source(source, max_frames=max_frames, duration=duration)
+            if not cap.isOpened():
+                raise RuntimeError(f"Could not open frame source {source}")
+
+            if self.index is not None:
+                identify = make_embedding_identifier(self.index)
+                expected_labels = {f"person{person_id}": person_id for person_id in self.index.names}
+            else:
+                label_map = load_label_map(dataset_path)
+                identify = make_softmax_identifier(load_person_names(names_path), label_map)
+                expected_labels = {f"person{person_id}": person_id for person_id in label_map.values()}
+            voter = TrackVoter(track_votes, confidence_threshold) if track_votes else None
+            postprocess, log_event, counts = make_frame_handlers(
+                identify, csv_path, location, confidence_threshold, expected_labels=expected_labels,
+                voter=voter, db_path=db_path)
+            pipeline = RecognitionPipeline(cap, None,
+                                           lambda: make_face_detector(detect_scale, detect_interval, tracker),
+                                           postprocess, log_event,
+                                           detection_workers=detection_workers_for(self.detection_workers,
+                                                                                   detect_interval, track_votes),
+                                           batcher=self.batcher,
+                                           select=voter.select if voter else None,
+                                           location=location)
+
+            stream = RecognitionStream(stream_id, location, source, cap, pipeline, counts,
+                                       confidence_threshold, headless, csv_path, db_path)
+            self.streams[stream_id] = stream
+            print(f"[{stream_id}] Recognition started at '{location}' from source {source}")
+            return stream.start()
+
+    def enroll(self, person_id, name, data_dir='face_data'):
+        """Add a person to the embedding index; running streams recognise them immediately"""
+        from embeddings import enroll_person
+
+        if not self.index_path:
+            raise ValueError("Enrollment requires an embedding index")
+        with self._lock:
+            self._ensure_model()
+        return enroll_person(self.predictor.model, self.index, person_id, name, data_dir, self.img_size)
+
+    def stop_stream(self, stream_id):
+        """Stop a stream; returns its final status or None if unknown"""
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            return None
+        stream.stop()
+        return stream.status()
+
+    def status(self, stream_id=None):
+        """Status of one stream, or of every stream when stream_id is None"""
+        if stream_id is not None:
+            stream = self.streams.get(stream_id)
+            return stream.status() if stream is not None else None
+        return [stream.status() for stream in list(self.streams.values())]
+
+    def stop_all(self):
+        for stream in list(self.streams.values()):
+            stream.stop()
+        if self.batcher is not None:
+            self.batcher.stop()
@@ -5,11 +5,19 @@ import json
 import datetime
 import csv
 import time
-from tensorflow.keras.models import load_model
+import queue
 from pathlib import Path
+from inference import load_predictor
+from pipeline import RecognitionPipeline
+from frame_sources import open_frame_source
+import dataset_store
+from face_detection import FaceDetector
+from track_voting import TrackVoter
+from attendance_log import LOG_FIELDS, get_log_writer
+from event_bus import recognition_events
 
-def load_person_names(names_path='person_names.json'):
-    """Load person names mapping from JSON file"""
+def load_person_names(names_path='label_names.json'):
+    """Load the label index -> name mapping written by create_npz_dataset"""
     if os.path.exists(names_path):
         with open(names_path, 'r') as f:
             return json.load(f)
@@ -22,8 +30,7 @@ def initialize_csv(csv_path='recognition_log.csv'):
     file_exists = os.path.isfile(csv_path)
     
     with open(csv_path, 'a', newline='') as csvfile:
-        fieldnames = ['timestamp', 'person_id', 'person_name', 'confidence', 'location']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=LOG_FIELDS)
         
         if not file_exists:
             writer.writeheader()
@@ -31,27 +38,226 @@ def initialize_csv(csv_path='recognition_log.csv'):
     
     return csv_path
 
-def log_recognition(csv_path, person_id, person_name, confidence, location="Unknown"):
-    """Log recognition event to CSV file"""
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    with open(csv_path, 'a', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=['timestamp', 'person_id', 'person_name', 'confidence', 'location'])
-        writer.writerow({
-            'timestamp': timestamp,
-            'person_id': person_id,
-            'person_name': person_name,
-            'confidence': confidence,
-            'location': location
-        })
+def log_recognition(csv_path, person_id, person_name, confidence, location="Unknown", db_path=None,
+                    timestamp=None):
+    """Queue a recognition event for the CSV file's background writer (see attendance_log).
+
+    With db_path the event is also stored in the SQLite attendance store.
+    """
+    get_log_writer(csv_path, db_path).write(person_id, person_name, confidence, location, timestamp)
+
+def load_label_map(dataset_path='face_dataset.npz'):
+    """Load the {label index: person id} map stored alongside the dataset, as strings"""
+    if not os.path.exists(dataset_path):
+        print(f"Warning: {dataset_path} not found. Logging label indexes instead of person IDs.")
+        return {}
+    label_map = dataset_store.read_label_map(dataset_path)
+    return {str(label_idx): str(person_id) for person_id, label_idx in label_map.items()}
+
+def make_softmax_identifier(person_names, label_map=None):
+    """Map softmax outputs to (person_id, name, confidence).
+
+    Label indexes are renumbered whenever the dataset changes, so they are
+    translated to person IDs through `label_map` (see load_label_map)
+    before anything is logged.
+    """
+    label_map = label_map or {}
+    def identify(predictions):
+        results = []
+        for prediction in predictions:
+            predicted_idx = np.argmax(prediction)
+            confidence = float(prediction[predicted_idx])
+            # The label index as a string matches label_names.json
+            label = str(predicted_idx)
+            results.append((label_map.get(label, label), person_names.get(label, "Unknown"), confidence))
+        return results
+    return identify
+
+def make_embedding_identifier(index):
+    """Map face embeddings to (person_id, name, similarity) by nearest-neighbour search"""
+    def identify(embeddings):
+        if len(embeddings) == 0:
+            return []
+        return [(person_id, index.names.get(person_id, "Unknown"), similarity)
+                for person_id, similarity in index.search(embeddings)]
+    return identify
+
+def make_face_detector(scale=1.0, detect_interval=1, tracker='iou'):
+    """Create a face detector (see face_detection.FaceDetector); it is not thread-safe, so use one per thread"""
+    return FaceDetector(scale, detect_interval, tracker)
+
+def detection_workers_for(detection_workers, detect_interval, track_votes=0):
+    """Tracking needs every frame of a stream in order, so it runs on a single detection worker"""
+    return 1 if detect_interval > 1 or track_votes else detection_workers
+
+def make_frame_handlers(identify, csv_path, location, confidence_threshold,
+                        expected_labels=None, log_cooldown=5, voter=None, db_path=None):
+    """Build the pipeline callbacks that label predictions and log recognitions.
+
+    `identify` maps a frame's model outputs to (person_id, name, confidence)
+    tuples (see make_softmax_identifier / make_embedding_identifier).
+    Returns (postprocess, log_event, counts), where counts tracks faces seen,
+    faces classified by the model and, for tagged frames found in
+    expected_labels, how many were correct.
+
+    With a TrackVoter (pass `voter.select` to the pipeline too) a face track
+    is logged once, when its identity is decided, instead of on every frame.
+    Events go to the CSV log and, with db_path, the attendance store, and are
+    published on event_bus.recognition_events for live dashboards.
+    """
+    expected_labels = expected_labels or {}
+    counts = {'faces': 0, 'classified': 0, 'scored': 0, 'correct': 0}
+
+    # To avoid duplicate logs for the same person
+    last_logged = {}  # {person_id: timestamp}
+
+    def postprocess(packet):
+        """Label the faces of a frame and return the events that should be logged"""
+        events = []
+        results = identify(packet.predictions)
+        counts['classified'] += len(results)
+        if voter is not None and packet.track_ids is not None:
+            faces = voter.label(packet, results)
+        else:
+            faces = [result + (True,) for result in results]
+
+        for person_id, name, confidence, decided in faces:
+            # Debug info
+            if decided and confidence > 0.3:  # Show debug for significant predictions
+                print(f"Prediction: id={person_id}, confidence={confidence:.2f}, name={name}")
+
+            packet.labels.append((name, confidence))
+
+            counts['faces'] += 1
+            if packet.tag in expected_labels:
+                counts['scored'] += 1
+                counts['correct'] += int(person_id == expected_labels[packet.tag])
+            
+            # Log recognition event with cooldown to avoid duplicate entries
+            current_time = time.time()
+            if decided and confidence > confidence_threshold:
+                if person_id not in last_logged or (current_time - last_logged[person_id]) > log_cooldown:
+                    last_logged[person_id] = current_time
+                    events.append((person_id, name, confidence))
+        return events
+
+    def log_event(event):
+        person_id, name, confidence = event
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        log_recognition(csv_path, person_id, name, confidence, location, db_path, timestamp)
+        recognition_events.publish({'timestamp': timestamp, 'person_id': person_id, 'person_name': name,
+                                    'confidence': round(float(confidence), 4), 'location': location})
+        print(f"Logged: {name} (ID: {person_id}) at {location} with confidence {confidence:.2f}")
+
+    return postprocess, log_event, counts
+
+def draw_labels(frame, packet, confidence_threshold):
+    """Draw the face boxes and identities of a processed frame"""
+    for (x, y, w, h), (name, confidence) in zip(packet.faces, packet.labels):
+        # Set rectangle color based on confidence
+        color = (0, 255, 0) if confidence > confidence_threshold else (0, 165, 255)
+        
+        # Display results
+        label = f"{name} ({confidence:.2f})"
+        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+        cv2.putText(frame, label, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+def run_pipeline(pipeline, confidence_threshold, headless=False, window_name='Face Recognition',
+                 stats_interval=10, on_report=None):
+    """Consume finished frames until the pipeline stops (or 'q' is pressed); returns elapsed seconds"""
+    if not headless:
+        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+    started = last_report = time.time()
+
+    try:
+        while pipeline.running():
+            try:
+                packet = pipeline.results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            # Periodically report inference latency and throughput
+            if on_report and stats_interval and time.time() - last_report > stats_interval:
+                on_report()
+                last_report = time.time()
+
+            if headless:
+                continue
+
+            frame = packet.frame
+            draw_labels(frame, packet, confidence_threshold)
+
+            # Display the resulting frame
+            cv2.imshow(window_name, frame)
+            
+            # Break on 'q' key press
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        pipeline.stop()
+        if not headless:
+            cv2.destroyWindow(window_name)
+
+    return time.time() - started
+
+def summarize(pipeline, counts, elapsed):
+    """Summary of a recognition run: frames, FPS, faces and replay accuracy"""
+    return {
+        'frames': pipeline.frames_processed,
+        'seconds': round(elapsed, 3),
+        'fps': round(pipeline.frames_processed / elapsed, 2) if elapsed > 0 else 0.0,
+        'faces': counts['faces'],
+        'classified': counts['classified'],
+        'accuracy': round(counts['correct'] / counts['scored'], 4) if counts['scored'] else None,
+    }
 
 def start_recognition(model_path='face_recognition_model.h5', 
-                      names_path='person_names.json',
+                      names_path='label_names.json',
                       csv_path='recognition_log.csv',
                       location="Main Entrance",
                       img_size=(92, 112),
-                      confidence_threshold=0.5):
-    """Start real-time face recognition with logging to CSV"""
+                      confidence_threshold=0.5,
+                      stats_interval=10,
+                      detection_workers=2,
+                      max_batch_frames=4,
+                      source=0,
+                      headless=False,
+                      max_frames=None,
+                      duration=None,
+                      dataset_path='face_dataset.npz',
+                      embedding_index=None,
+                      detect_scale=1.0,
+                      detect_interval=1,
+                      tracker='iou',
+                      track_votes=0,
+                      db_path='attendance.db'):
+    """Start real-time face recognition with logging to CSV.
+
+    Capture, face detection, batched inference and CSV logging run as separate
+    pipeline stages so a slow prediction never stalls the camera.
+
+    `source` is a camera index, video file, stream URL or image directory/glob
+    (see frame_sources.open_frame_source). With headless=True no window is
+    opened, and max_frames/duration bound the run so recorded input can be
+    replayed as a benchmark. Returns a summary dict with FPS and, for image
+    directories named person<id>, accuracy against the dataset label map,
+    which also translates softmax outputs to the person IDs that are logged.
+
+    With `embedding_index` (see embeddings.py) faces are identified by
+    nearest-neighbour search over enrolled embeddings instead of the softmax
+    output, so newly enrolled students are recognised without retraining.
+
+    `detect_scale` < 1 runs face detection on a downscaled frame and
+    `detect_interval` > 1 only re-detects every N frames, tracking faces
+    in between with `tracker`; both trade some accuracy for FPS.
+    With `track_votes` > 0 each face track is classified only until that
+    many predictions agree on an identity (see track_voting.TrackVoter).
+
+    Recognitions are appended to `csv_path` and stored in the SQLite
+    attendance store at `db_path` (None to skip it).
+    """
+    startup = time.perf_counter()
+
     # Check if model exists
     if not os.path.exists(model_path):
         print(f"Error: Model file {model_path} not found. Please train the model first.")
@@ -59,97 +265,80 @@ def start_recognition(model_path='face_recognition_model.h5',
 
     # Initialize log file
     csv_path = initialize_csv(csv_path)
+    try:
+        get_log_writer(csv_path, db_path)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
     print(f"Recognition events will be logged to: {csv_path}")
     print(f"Current location set to: {location}")
 
     # Load model and person names
     try:
         print(f"Loading model from {model_path}...")
-        model = load_model(model_path)
+        predictor = load_predictor(model_path, img_size, embedding=bool(embedding_index))
+        if embedding_index:
+            from embeddings import EmbeddingIndex
+            index = EmbeddingIndex(embedding_index)
+            identify = make_embedding_identifier(index)
+            expected_labels = {f"person{person_id}": person_id for person_id in index.names}
+        else:
+            person_names = load_person_names(names_path)
+            print(f"Loaded {len(person_names)} person identities: {person_names}")
+            label_map = load_label_map(dataset_path)
+            identify = make_softmax_identifier(person_names, label_map)
+            # Ground truth for replayed face_data/person*/ directories
+            expected_labels = {f"person{person_id}": person_id for person_id in label_map.values()}
         print("Model loaded successfully")
-        
-        person_names = load_person_names(names_path)
-        print(f"Loaded {len(person_names)} person identities: {person_names}")
     except Exception as e:
         print(f"Error loading model or person names: {str(e)}")
         return
 
-    # Initialize face detector
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
-    # Set up camera
-    print("Initializing camera...")
-    cap = cv2.VideoCapture(0)
+    # Set up frame source
+    print(f"Initializing frame source {source}...")
+    cap = open_frame_source(source, max_frames=max_frames, duration=duration)
     if not cap.isOpened():
-        print("Error: Could not open webcam")
+        print(f"Error: Could not open frame source {source}")
         return
 
-    # Create window
-    cv2.namedWindow('Face Recognition', cv2.WINDOW_NORMAL)
-    print("Starting real-time face recognition. Press 'q' to quit.")
-    
-    # To avoid duplicate logs for the same person
-    last_logged = {}  # {person_id: timestamp}
-    log_cooldown = 5  # seconds between logs for same person
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Failed to grab frame")
-            break
-
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 5)
-
-        for (x, y, w, h) in faces:
-            # Prepare face for prediction
-            face_img = gray[y:y+h, x:x+w]
-            face_img = cv2.resize(face_img, img_size).astype('float32') / 255.0
-            face_img = face_img.reshape(1, img_size[1], img_size[0], 1)
-
-            # Make prediction
-            prediction = model.predict(face_img, verbose=0)[0]
-            predicted_idx = np.argmax(prediction)
-            confidence = float(prediction[predicted_idx])
-            
-            # Get person name or mark as unknown
-            # The key is the label index as a string, which matches what we stored in names_path
-            person_id = str(predicted_idx)
-            name = person_names.get(person_id, "Unknown")
-            
-            # Debug info
-            if confidence > 0.3:  # Show debug for significant predictions
-                print(f"Prediction: index={predicted_idx}, confidence={confidence:.2f}, name={name}")
-                print(f"Available IDs in person_names: {list(person_names.keys())}")
+    if headless:
+        print("Starting headless face recognition.")
+    else:
+        print("Starting real-time face recognition. Press 'q' to quit.")
 
-            # Set rectangle color based on confidence
-            color = (0, 255, 0) if confidence > confidence_threshold else (0, 165, 255)
-            
-            # Display results
-            label = f"{name} ({confidence:.2f})"
-            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-            cv2.putText(frame, label, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-            
-            # Log recognition event with cooldown to avoid duplicate entries
-            current_time = time.time()
-            if confidence > confidence_threshold:
-                if person_id not in last_logged or (current_time - last_logged[person_id]) > log_cooldown:
-                    log_recognition(csv_path, person_id, name, confidence, location)
-                    last_logged[person_id] = current_time
-                    print(f"Logged: {name} (ID: {person_id}) at {location} with confidence {confidence:.2f}")
+    voter = TrackVoter(track_votes, confidence_threshold) if track_votes else None
+    postprocess, log_event, counts = make_frame_handlers(
+        identify, csv_path, location, confidence_threshold, expected_labels=expected_labels, voter=voter,
+        db_path=db_path)
 
-        # Display the resulting frame
-        cv2.imshow('Face Recognition', frame)
-        
-        # Break on 'q' key press
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+    pipeline = RecognitionPipeline(cap, predictor,
+                                   lambda: make_face_detector(detect_scale, detect_interval, tracker),
+                                   postprocess, log_event,
+                                   detection_workers=detection_workers_for(detection_workers, detect_interval,
+                                                                           track_votes),
+                                   max_batch_frames=max_batch_frames,
+                                   select=voter.select if voter else None,
+                                   location=location).start()
+    print(f"[STARTUP] Recognition started {time.perf_counter() - startup:.2f}s after the request")
+
+    def report():
+        predictor.report(reset=False)
+        pipeline.report()
+
+    elapsed = run_pipeline(pipeline, confidence_threshold, headless=headless,
+                           stats_interval=stats_interval, on_report=report)
 
     # Clean up
     cap.release()
-    cv2.destroyAllWindows()
+    if not get_log_writer(csv_path, db_path).flush():
+        print(f"Warning: not every recognition reached {csv_path}")
+    predictor.report()
+    pipeline.report()
+
+    summary = summarize(pipeline, counts, elapsed)
+    print(f"Recognition summary: {summary}")
     print("Face recognition stopped")
+    return summary
 
 def main():
     print("\n===== Face Recognition System =====")
@@ -159,21 +348,41 @@ def main():
     parser = argparse.ArgumentParser(description='Face Recognition System')
     parser.add_argument('--model', dest='model_path', default='face_recognition_model.h5',
                         help='Path to model file (default: face_recognition_model.h5)')
-    parser.add_argument('--names', dest='names_path', default='person_names.json',
-                        help='Path to names mapping file (default: person_names.json)')
+    parser.add_argument('--names', dest='names_path', default='label_names.json',
+                        help='Label index to name mapping written with the dataset (default: label_names.json)')
     parser.add_argument('--csv', dest='csv_path', default='recognition_log.csv',
                         help='Path to CSV log file (default: recognition_log.csv)')
     parser.add_argument('--location', dest='location', default='Main Entrance',
                         help='Current location (default: Main Entrance)')
     parser.add_argument('--confidence', dest='confidence', type=float, default=0.5,
                         help='Confidence threshold (0-1, default: 0.5)')
+    parser.add_argument('--source', dest='source', default='0',
+                        help='Camera index, video file, stream URL or image directory/glob (default: 0)')
+    parser.add_argument('--headless', action='store_true',
+                        help='Run without opening a preview window')
+    parser.add_argument('--max-frames', dest='max_frames', type=int, default=None,
+                        help='Stop after this many frames')
+    parser.add_argument('--duration', dest='duration', type=float, default=None,
+                        help='Stop after this many seconds')
+    parser.add_argument('--embedding-index', dest='embedding_index', default=None,
+                        help='Identify faces with this embedding index instead of the softmax output')
+    parser.add_argument('--detect-scale', dest='detect_scale', type=float, default=1.0,
+                        help='Downscale frames by this factor before face detection (default: 1.0)')
+    parser.add_argument('--detect-interval', dest='detect_interval', type=int, default=1,
+                        help='Run face detection every N frames and track faces in between (default: 1)')
+    parser.add_argument('--tracker', default='iou',
+                        help="Tracker between detections: iou (keep last boxes), kcf, csrt or mil (default: iou)")
+    parser.add_argument('--db', dest='db_path', default='attendance.db',
+                        help='SQLite attendance store, "" to disable (default: attendance.db)')
+    parser.add_argument('--track-votes', dest='track_votes', type=int, default=0,
+                        help='Classify each face track only until this many predictions decide it (default: 0, off)')
     
     # If no arguments provided or running in interactive mode, use input prompts
     args, unknown = parser.parse_known_args()
     
     if '--interactive' in unknown or len(unknown) > 0 and unknown[0] == '--interactive':
         model_path = input("Enter model path (default: face_recognition_model.h5): ") or "face_recognition_model.h5"
-        names_path = input("Enter names mapping path (default: person_names.json): ") or "person_names.json"
+        names_path = input("Enter names mapping path (default: label_names.json): ") or "label_names.json"
         csv_path = input("Enter log file path (default: recognition_log.csv): ") or "recognition_log.csv"
         location = input("Enter current location (default: Main Entrance): ") or "Main Entrance"
         confidence_threshold = float(input("Enter confidence threshold (0-1, default: 0.5): ") or "0.5")
@@ -184,7 +393,12 @@ def main():
         location = args.location
         confidence_threshold = args.confidence
     
-    start_recognition(model_path, names_path, csv_path, location, confidence_threshold=confidence_threshold)
+    start_recognition(model_path, names_path, csv_path, location, confidence_threshold=confidence_threshold,
+                      source=args.source, headless=args.headless,
+                      max_frames=args.max_frames, duration=args.duration,
+                      embedding_index=args.embedding_index, detect_scale=args.detect_scale,
+                      detect_interval=args.detect_interval, tracker=args.tracker,
+                      track_votes=args.track_votes, db_path=args.db_path or None)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,23 +1,107 @@
 # server.py  (run with:  python server.py)
+import time
+_startup = time.perf_counter()
+
+import base64
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
 import threading
 from pathlib import Path
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
 
 # ---- import the helpers you already wrote -----------------
+# TensorFlow and matplotlib are only imported by the first job that needs them,
+# so the API comes up in well under a second
 from face_data_collection import FaceDataCollector
-from training            import train_model            # <-- your train_model()
-from recognizing         import start_recognition      # <-- your start_recognition()
+from recognition_manager import RecognitionManager     # one shared model, many camera streams
+from attendance_store    import AttendanceStore, COLUMNS as LOG_COLUMNS
+from event_bus           import recognition_events
+from job_manager         import JobManager
+from inference           import is_tflite_model
+import metrics
 
 app  = Flask(__name__)
 CORS(app)                              # allow requests from http://localhost:3000 etc.
 root = Path(__file__).parent           # convenience
 
+HTTP_REQUESTS = metrics.registry.counter("http_requests_total", "API requests",
+                                         ["method", "endpoint", "status"])
+HTTP_SECONDS  = metrics.registry.histogram("http_request_seconds", "API request handling time",
+                                           ["method", "endpoint"])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # the route pattern, not the URL, so /api/jobs/<job_id> stays one series
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_REQUESTS.labels(request.method, endpoint, response.status_code).inc()
+    started = g.get("request_started")
+    if started is not None:
+        HTTP_SECONDS.labels(request.method, endpoint).observe(time.perf_counter() - started)
+    return response
+
+# collect / train / recognition jobs, polled through /api/jobs/<id>
+jobs = JobManager()
+
+# every job writing face_data/ and person_names.json (webcam collection, media
+# enrollment) shares this key, so they run one after another
+FACE_DATA_JOB = "face_data"
+
 # keep one collector instance around so we don’t reopen the webcam each time
-collector = FaceDataCollector(
-    data_dir = root / "face_data",
-    names_path = root / "person_names.json"
-)
+# (created on first use, loading the face cascade is not free)
+collector = None
+
+def get_collector():
+    global collector
+    if collector is None:
+        collector = FaceDataCollector(
+            data_dir = root / "face_data",
+            names_path = root / "person_names.json"
+        )
+    return collector
+
+# one recognition manager per model file: the model is loaded once and shared
+# by every camera stream that uses it
+recognition_managers = {}
+managers_lock = threading.Lock()
+
+def get_recognition_manager(model_pth, index_pth=None):
+    key = (model_pth, index_pth)
+    with managers_lock:
+        if key not in recognition_managers:
+            recognition_managers[key] = RecognitionManager(model_pth, index_path=index_pth)
+        return recognition_managers[key]
+
+# attendance store behind /api/logs; filled from recognition_log.csv the first time
+attendance_store = None
+store_lock = threading.Lock()
+
+def get_attendance_store():
+    global attendance_store
+    with store_lock:
+        if attendance_store is None:
+            store = AttendanceStore("attendance.db")
+            if store.last_id() == 0 and Path("recognition_log.csv").exists():
+                store.import_csv("recognition_log.csv")
+            attendance_store = store
+        return attendance_store
+
+def find_stream(stream_id):
+    for manager in list(recognition_managers.values()):
+        if stream_id in manager.streams:
+            return manager
+    return None
 
 # --------------------------------------------------------------------------
 # 1)  /api/collect-faces   ---------------  triggered by “Collect Faces” btn
@@ -28,19 +112,32 @@ def api_collect_faces():
     person_id   = data.get("personId")
     person_name = data.get("personName")
     num_images  = int(data.get("numImages", 100))
+    det_scale   = float(data.get("detectScale", 1.0))
+    det_every   = int(data.get("detectInterval", 1))
+    auto        = bool(data.get("auto", False))              # capture without pressing 'c'
+    rate        = float(data.get("captureRate", 10.0))       # auto captures per second
 
     if person_id is None or person_name is None:
         return jsonify({"message": "personId and personName are required"}), 400
 
-    # run the long‑running OpenCV capture in a background thread
-    threading.Thread(
-        target=collector.collect_face_data,
-        args=(person_id, person_name, num_images),
-        daemon=True
-    ).start()
+    def collect_job(job, person_id, person_name, num_images, det_scale, det_every, auto, rate):
+        collected = get_collector().collect_face_data(person_id, person_name, num_images,
+                                                      det_scale, det_every, job=job,
+                                                      auto=auto, capture_rate=rate)
+        if collected is None:
+            raise RuntimeError("Could not open camera")
+        return {"images": collected}
+
+    # run the long‑running OpenCV capture as a background job; it queues behind
+    # other collections (one webcam) and media enrollments (same face_data/)
+    job = jobs.submit("collect", collect_job, key=FACE_DATA_JOB,
+                      person_id=person_id, person_name=person_name, num_images=num_images,
+                      det_scale=det_scale, det_every=det_every, auto=auto, rate=rate)
 
     return jsonify({
-        "message": f"Started collecting {num_images} images for {person_name} (ID {person_id})."
+        "message": f"Started collecting {num_images} images for {person_name} (ID {person_id}).",
+        "jobId": job.job_id,
+        "status": job.status
     }), 202     # 202 = accepted / processing
 
 # --------------------------------------------------------------------------
@@ -54,13 +151,53 @@ def api_train_model():
     batch_size  = int(data.get("batchSize",   32))
     dataset_pth = str(data.get("datasetPath", "face_dataset.npz"))
     model_pth   = str(data.get("modelPath",   "face_recognition_model.h5"))
+    pipeline    = str(data.get("inputPipeline", "sequence"))   # sequence | tfdata | tfdata-images
+    augment     = bool(data.get("augment",    False))
+    precision   = str(data.get("precision",   "auto"))      # auto | float32 | bfloat16 | float16
+    intra_op    = int(data.get("intraOpThreads", 0))        # 0 = TensorFlow default
+    inter_op    = int(data.get("interOpThreads", 0))
+    tflite_pth  = data.get("exportTflite")                   # optional .tflite export after training
+    quantize    = data.get("quantize")                       # none | float16 | int8
+    dedup       = data.get("dedupThreshold")                 # rebuild the dataset without near-duplicates
+
+    if dedup is not None:
+        if pipeline == "tfdata-images":
+            return jsonify({"message": "dedupThreshold needs a dataset file; tfdata-images trains on "
+                                       "face_data directly"}), 400
+        try:
+            dedup = int(dedup)
+        except (TypeError, ValueError):
+            return jsonify({"message": "dedupThreshold must be an integer"}), 400
 
-    def train_job():
-        _, val_acc = train_model(model_pth, dataset_pth, epochs, batch_size)
+    def train_job(job, **params):
+        from training import train_model            # <-- your train_model()
+        model, val_acc = train_model(params["model_pth"], params["dataset_pth"], params["epochs"],
+                                     params["batch_size"], input_pipeline=params["pipeline"],
+                                     augment=params["augment"], precision=params["precision"],
+                                     intra_op_threads=params["intra_op"], inter_op_threads=params["inter_op"],
+                                     tflite_path=params["tflite_pth"], quantize=params["quantize"], job=job,
+                                     dedup_threshold=params["dedup"])
+        if job.cancelled():
+            return None
+        if model is None:
+            raise RuntimeError("Training failed, see the server log")
         print(f"[TRAIN] finished – best val_acc={val_acc:.4f}")
+        result = {"valAccuracy": round(float(val_acc), 4), "modelPath": params["model_pth"]}
+        if "exportError" in job.info:                  # model trained fine, only the .tflite export failed
+            result["exportError"] = job.info["exportError"]
+        elif "tflitePath" in job.info:
+            result["tflitePath"] = job.info["tflitePath"]
+        return result
 
-    threading.Thread(target=train_job, daemon=True).start()
-    return jsonify({"message": "Training job started"}), 202
+    # only one training job per dataset runs at a time; later ones wait in the queue
+    job = jobs.submit("train", train_job, key=os.path.abspath(dataset_pth),
+                      model_pth=model_pth, dataset_pth=dataset_pth, epochs=epochs, batch_size=batch_size,
+                      pipeline=pipeline, augment=augment, precision=precision, intra_op=intra_op,
+                      inter_op=inter_op, tflite_pth=tflite_pth, quantize=quantize,
+                      dedup=dedup)
+    return jsonify({"message": "Training job queued" if job.status == "queued" else "Training job started",
+                    "jobId": job.job_id,
+                    "status": job.status}), 202
 
 # --------------------------------------------------------------------------
 # 3)  /api/start-recognition  -----------  triggered by “Start Recognition” btn
@@ -71,25 +208,350 @@ def api_start_recognition():
     location_name = data.get("location", "Main Entrance")
     confidence    = float(data.get("confidence", 0.5))
     model_pth     = str(data.get("modelPath", "face_recognition_model.h5"))
-    names_pth     = str(data.get("namesPath", "person_names.json"))
+    names_pth     = str(data.get("namesPath", "label_names.json"))   # label index -> name, written with the dataset
     csv_pth       = str(data.get("csvPath",   "recognition_log.csv"))
+    db_pth        = data.get("dbPath", "attendance.db")  # SQLite attendance store, null to disable
+    source        = data.get("source", 0)               # camera index, video file, URL or image dir
+    headless      = bool(data.get("headless", False))  # no preview window on display-less servers
+    max_frames    = data.get("maxFrames")
+    duration      = data.get("duration")
+    stream_id     = data.get("streamId")               # optional, generated if missing
+    index_pth     = data.get("embeddingIndex")         # identify by embedding search instead of softmax
+    det_scale     = float(data.get("detectScale", 1.0))  # < 1: detect faces on a downscaled frame
+    det_every     = int(data.get("detectInterval", 1))   # > 1: detect every N frames, track in between
+    tracker       = str(data.get("tracker", "iou"))      # iou | kcf | csrt | mil
+    track_votes   = int(data.get("trackVotes", 0))       # > 0: classify each face track once
+    dataset_pth   = str(data.get("datasetPath", "face_dataset.npz"))  # label map: model output -> person id
 
     if not Path(model_pth).exists():
         return jsonify({"message": f"Model file {model_pth} not found"}), 404
 
-    threading.Thread(
-        target=start_recognition,
-        kwargs=dict(
-            model_path=model_pth,
+    try:
+        stream = get_recognition_manager(model_pth, index_pth).start_stream(
+            location_name,
+            source=source,
+            confidence_threshold=confidence,
+            stream_id=stream_id,
             names_path=names_pth,
             csv_path=csv_pth,
-            location=location_name,
-            confidence_threshold=confidence
-        ),
-        daemon=True
-    ).start()
+            headless=headless,
+            max_frames=int(max_frames) if max_frames is not None else None,
+            duration=float(duration) if duration is not None else None,
+            detect_scale=det_scale,
+            detect_interval=det_every,
+            tracker=tracker,
+            track_votes=track_votes,
+            db_path=db_pth,
+            dataset_path=dataset_pth
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 409
+    except (FileNotFoundError, RuntimeError) as e:
+        return jsonify({"message": str(e)}), 500
+
+    job = jobs.submit("recognition", watch_stream, manager=get_recognition_manager(model_pth, index_pth),
+                      stream_id=stream.stream_id, max_frames=max_frames, duration=duration)
+
+    return jsonify({
+        "message": f"Recognition started at '{location_name}'",
+        "streamId": stream.stream_id,
+        "jobId": job.job_id
+    }), 202
+
+def watch_stream(job, manager, stream_id, max_frames=None, duration=None):
+    """Mirror a recognition stream into its job; cancelling the job stops the stream"""
+    while True:
+        status = manager.status(stream_id)
+        if status is None:
+            return None
+        elapsed = (status["finishedAt"] or time.time()) - status["startedAt"]
+        if max_frames:
+            progress = status["processed"] / float(max_frames)
+        elif duration:
+            progress = elapsed / float(duration)
+        else:
+            progress = None
+        job.update(progress, streamId=stream_id, location=status["location"],
+                   frames=status["processed"], fps=status["fps"], faces=status["faces"],
+                   accuracy=status["accuracy"])
+        if not status["running"]:
+            return {"frames": status["processed"], "fps": status["fps"], "faces": status["faces"],
+                    "accuracy": status["accuracy"]}
+        if job.sleep(1.0):
+            manager.stop_stream(stream_id)
+
+# --------------------------------------------------------------------------
+# 3b) /api/enroll  -----------------------  add a collected person to the embedding index
+# --------------------------------------------------------------------------
+@app.route("/api/enroll", methods=["POST"])
+def api_enroll():
+    data        = request.get_json(force=True)
+    person_id   = data.get("personId")
+    person_name = data.get("personName")
+    model_pth   = str(data.get("modelPath", "face_recognition_model.h5"))
+    index_pth   = str(data.get("embeddingIndex", "face_embeddings"))
+
+    if person_id is None or person_name is None:
+        return jsonify({"message": "personId and personName are required"}), 400
+    if is_tflite_model(model_pth):
+        return jsonify({"message": "Enrollment needs the trained Keras model (.h5/.keras), "
+                                   "a .tflite export has no embedding layer"}), 400
+    if not Path(model_pth).exists():
+        return jsonify({"message": f"Model file {model_pth} not found"}), 404
+
+    # seconds of embedding work, no retraining – fine to do inline
+    enrolled = get_recognition_manager(model_pth, index_pth).enroll(
+        person_id, person_name, data_dir=root / "face_data")
+    if not enrolled:
+        return jsonify({"message": f"No face images found for person {person_id}"}), 404
+    return jsonify({"message": f"Enrolled {person_name} (ID {person_id})"}), 200
+
+# --------------------------------------------------------------------------
+# 3c) /api/enroll-media  -----------------  bulk enrollment from uploaded videos / zips of photos
+# --------------------------------------------------------------------------
+@app.route("/api/enroll-media", methods=["POST"])
+def api_enroll_media():
+    # multipart form: one or more "files", plus either personId + personName for a
+    # single student or a "manifest" JSON list of {personId, personName, files: [...]}, where
+    # files are upload indexes or filenames (a filename matches every upload with that name)
+    files = request.files.getlist("files")
+    if not files:
+        return jsonify({"message": "Upload one or more video, zip or image files as 'files'"}), 400
+
+    upload_dir = Path(tempfile.mkdtemp(prefix="enroll_"))
+    saved = []      # (filename, path) by upload position: two uploads may share a filename
+    for i, upload in enumerate(files):
+        path = upload_dir / f"{i}_{secure_filename(upload.filename) or 'upload'}"
+        upload.save(path)
+        saved.append((upload.filename, str(path)))
+
+    def parse_person_id(value):
+        # becomes the face_data/person<id>/ directory, so only whole numbers
+        if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+            raise ValueError(f"personId must be a non-negative integer, got {value!r}")
+        return int(value)
+
+    def resolve(ref):
+        if isinstance(ref, int) and not isinstance(ref, bool):
+            if not 0 <= ref < len(saved):
+                raise ValueError(f"file index {ref} is out of range for {len(saved)} uploads")
+            return [saved[ref][1]]
+        paths = [path for name, path in saved if name == ref]
+        if not paths:
+            raise KeyError(ref)
+        return paths
+
+    try:
+        if request.form.get("manifest"):
+            people = [(parse_person_id(entry["personId"]), entry["personName"],
+                       [path for ref in entry["files"] for path in resolve(ref)])
+                      for entry in json.loads(request.form["manifest"])]
+        elif request.form.get("personId") and request.form.get("personName"):
+            people = [(parse_person_id(request.form["personId"]), request.form["personName"],
+                       [path for _, path in saved])]
+        else:
+            raise ValueError("personId and personName (or a manifest) are required")
+        max_images = int(request.form.get("maxImages", 100))
+        frame_step = int(request.form.get("frameStep", 5))
+    except (ValueError, KeyError, TypeError) as e:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return jsonify({"message": f"Invalid enrollment request: {e}"}), 400
 
-    return jsonify({"message": f"Recognition started at '{location_name}'"}), 202
+    def enroll_job(job, people, upload_dir, max_images, frame_step):
+        try:
+            summary = get_collector().enroll_from_media(people, max_images, frame_step, job=job)
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+        return {str(person_id): result for person_id, result in (summary or {}).items()}
+
+    job = jobs.submit("enroll", enroll_job, key=FACE_DATA_JOB, people=people, upload_dir=str(upload_dir),
+                      max_images=max_images, frame_step=frame_step)
+    return jsonify({"message": f"Enrolling {len(people)} people from {len(files)} files",
+                    "jobId": job.job_id,
+                    "status": job.status}), 202
+
+# --------------------------------------------------------------------------
+# 4)  /api/streams  ----------------------  status / stop of recognition streams
+# --------------------------------------------------------------------------
+@app.route("/api/streams", methods=["GET"])
+def api_list_streams():
+    streams = [s for manager in list(recognition_managers.values()) for s in manager.status()]
+    return jsonify({"streams": streams}), 200
+
+@app.route("/api/streams/<stream_id>", methods=["GET"])
+def api_stream_status(stream_id):
+    manager = find_stream(stream_id)
+    if manager is None:
+        return jsonify({"message": f"Stream {stream_id} not found"}), 404
+    return jsonify(manager.status(stream_id)), 200
+
+@app.route("/api/streams/<stream_id>/stop", methods=["POST"])
+def api_stop_stream(stream_id):
+    manager = find_stream(stream_id)
+    if manager is None:
+        return jsonify({"message": f"Stream {stream_id} not found"}), 404
+    return jsonify(manager.stop_stream(stream_id)), 200
+
+# --------------------------------------------------------------------------
+# 4b) /api/jobs  -------------------------  progress / cancel of collect, train and recognition jobs
+# --------------------------------------------------------------------------
+@app.route("/api/jobs", methods=["GET"])
+def api_list_jobs():
+    return jsonify({"jobs": jobs.list(request.args.get("kind"))}), 200
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"message": f"Job {job_id} not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def api_cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"message": f"Job {job_id} not found"}), 404
+    return jsonify(job.to_dict()), 202
+
+# --------------------------------------------------------------------------
+# 5)  /api/logs  -------------------------  “Student Logs” tab, filterable + paginated
+# --------------------------------------------------------------------------
+def parse_log_filters(args):
+    """Filters of /api/logs; a date-only `end` includes that whole day"""
+    end = args.get("end")
+    if end and len(end) == 10:
+        end = (datetime.date.fromisoformat(end) + datetime.timedelta(days=1)).isoformat()
+    confidence = args.get("minConfidence")
+    return {
+        "person_id":      args.get("personId"),
+        "location":       args.get("location"),
+        "start":          args.get("start"),
+        "end":            end,
+        "min_confidence": float(confidence) if confidence else None,
+    }
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(f"{row['timestamp']}|{row['id']}".encode()).decode()
+
+def decode_cursor(cursor):
+    timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+    return timestamp, int(row_id)
+
+@app.route("/api/logs", methods=["GET"])
+def api_logs():
+    """Recognition events, newest first.
+
+    Query: start, end (YYYY-MM-DD or timestamp), personId, location,
+    minConfidence, limit, cursor (nextCursor of the previous page),
+    format=json|csv. JSON pages default to 1000 rows; CSV exports
+    everything unless a limit is given. Both are streamed row by row.
+    """
+    try:
+        filters = parse_log_filters(request.args)
+        cursor  = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        fmt     = request.args.get("format", "json")
+        limit   = request.args.get("limit")
+        limit   = int(limit) if limit else (1000 if fmt == "json" else None)
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be a positive integer")
+    except ValueError as e:
+        return jsonify({"message": f"Invalid query: {e}"}), 400
+    if fmt not in ("json", "csv"):
+        return jsonify({"message": "format must be json or csv"}), 400
+
+    store = get_attendance_store()
+    # Events are only ever appended, so the newest id identifies the data version
+    etag = hashlib.sha1(f"{store.last_id()}|{sorted(request.args.items())}".encode()).hexdigest()
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    # One extra row tells us whether there is a next page
+    rows = store.iter_query(**filters, descending=True, after=cursor,
+                            limit=limit + 1 if limit is not None else None)
+
+    def generate_json():
+        yield '{"logs": ['
+        last = None
+        for i, row in enumerate(rows):
+            if limit is not None and i == limit:
+                yield f'], "nextCursor": {json.dumps(encode_cursor(last))}}}'
+                return
+            yield ("," if i else "") + json.dumps(row)
+            last = row
+        yield '], "nextCursor": null}'
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=LOG_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for i, row in enumerate(rows):
+            if limit is not None and i == limit:
+                break
+            writer.writerow(row)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if fmt == "csv":
+        headers["Content-Disposition"] = "attachment; filename=attendance_logs.csv"
+        return Response(generate_csv(), mimetype="text/csv", headers=headers)
+    return Response(generate_json(), mimetype="application/json", headers=headers)
+
+# --------------------------------------------------------------------------
+# 6)  /api/stats  ------------------------  dashboard totals, read from precomputed rollups
+# --------------------------------------------------------------------------
+@app.route("/api/stats", methods=["GET"])
+def api_stats():
+    day = request.args.get("day")                      # YYYY-MM-DD, default today
+    stats = get_attendance_store().stats(day)
+    stats["activeStreams"] = sum(1 for manager in list(recognition_managers.values())
+                                 for stream in list(manager.streams.values()) if stream.running())
+    return jsonify(stats), 200
+
+# --------------------------------------------------------------------------
+# 7)  /api/events  -----------------------  live recognitions pushed as Server-Sent Events
+# --------------------------------------------------------------------------
+@app.route("/api/events", methods=["GET"])
+def api_events():
+    """EventSource stream of recognition events (optionally ?location=...).
+
+    Each client reads from its own bounded buffer; a client that falls too
+    far behind is sent a `dropped` event and disconnected, and the browser's
+    EventSource reconnects with Last-Event-ID to catch up.
+    """
+    location = request.args.get("location")
+    last_id  = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    subscription = recognition_events.subscribe(int(last_id) if last_id and last_id.isdigit() else None)
+
+    def stream():
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                event = subscription.get(timeout=15)
+                if event is None:
+                    if subscription.closed:
+                        yield "event: dropped\ndata: {}\n\n"
+                        return
+                    yield ": keep-alive\n\n"         # also notices disconnected clients
+                    continue
+                if location and event["location"] != location:
+                    continue
+                yield f"id: {event['id']}\nevent: recognition\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --------------------------------------------------------------------------
+# 8)  /api/metrics  ----------------------  Prometheus text format
+# --------------------------------------------------------------------------
+@app.route("/api/metrics", methods=["GET"])
+def api_metrics():
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
 
 # --------------------------------------------------------------------------
 # health‑check / convenience
@@ -100,5 +562,6 @@ def api_health():
 
 
 if __name__ == "__main__":
+    print(f"[STARTUP] API imports done in {time.perf_counter() - _startup:.2f}s")
     # host='0.0.0.0' so Docker or a phone on the LAN can reach it
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,97 @@
+import threading
+
+
+class TrackVoter:
+    """Decide the identity of every face track once, from a few predictions.
+
+    Faces carry the track IDs assigned by face_detection.FaceDetector. A
+    track is classified until it has `votes` predictions; the identity with
+    the highest summed confidence wins, with that sum divided by the number
+    of votes as its confidence, so disagreeing predictions lower it. A
+    decision below `confidence_threshold` is voted again, at most
+    `max_rounds` times. After that the track is never sent to the model
+    again until it has not been seen for `lost_after` frames.
+
+    `select(packet)` runs on the detection worker and marks the faces that
+    still need a prediction; `label(packet, results)` runs after inference.
+    """
+
+    def __init__(self, votes=5, confidence_threshold=0.5, max_rounds=3, lost_after=30):
+        self.votes = max(1, int(votes))
+        self.confidence_threshold = confidence_threshold
+        self.max_rounds = max_rounds
+        self.lost_after = lost_after
+
+        self.decided = {}     # track id -> (person_id, name, confidence)
+        self._ballots = {}    # track id -> [(person_id, name, confidence), ...]
+        self._rounds = {}     # track id -> voting rounds finished
+        self._last_seen = {}  # track id -> frame number
+        self._frame = 0
+        self._lock = threading.Lock()
+
+    def select(self, packet):
+        """Only faces of undecided tracks are sent to the model"""
+        if packet.track_ids is None:
+            return
+        with self._lock:
+            packet.infer = [track_id not in self.decided for track_id in packet.track_ids]
+
+    @staticmethod
+    def _tally(ballots):
+        totals, names = {}, {}
+        for person_id, name, confidence in ballots:
+            totals[person_id] = totals.get(person_id, 0.0) + confidence
+            names[person_id] = name
+        person_id = max(totals, key=totals.get)
+        return person_id, names[person_id], totals[person_id] / len(ballots)
+
+    def _vote(self, track_id, result):
+        """Add one prediction; returns (person_id, name, confidence, decided_now)"""
+        decision = self.decided.get(track_id)
+        if decision is not None:
+            return decision + (False,)
+
+        ballots = self._ballots.setdefault(track_id, [])
+        ballots.append(result)
+        person_id, name, confidence = self._tally(ballots)
+        if len(ballots) < self.votes:
+            return person_id, name, confidence, False
+
+        rounds = self._rounds.get(track_id, 0) + 1
+        if confidence < self.confidence_threshold and rounds < self.max_rounds:
+            # Likely a bad angle or motion blur: discard and vote again
+            self._rounds[track_id] = rounds
+            del self._ballots[track_id]
+            return person_id, name, confidence, False
+
+        self.decided[track_id] = (person_id, name, confidence)
+        self._ballots.pop(track_id, None)
+        self._rounds.pop(track_id, None)
+        return person_id, name, confidence, True
+
+    def label(self, packet, results):
+        """Label every face of a frame from the predictions of its undecided faces.
+
+        `results` holds the identify() output for the faces that were sent to
+        the model, in order. Returns (person_id, name, confidence, decided_now)
+        for every face of the frame.
+        """
+        infer = packet.infer if packet.infer is not None else [True] * len(packet.track_ids)
+        results = iter(results)
+        labels = []
+        with self._lock:
+            self._frame += 1
+            for track_id, predicted in zip(packet.track_ids, infer):
+                self._last_seen[track_id] = self._frame
+                if predicted:
+                    labels.append(self._vote(track_id, next(results)))
+                else:
+                    labels.append(self.decided.get(track_id, (None, "Unknown", 0.0)) + (False,))
+
+            for track_id, seen in list(self._last_seen.items()):
+                if self._frame - seen > self.lost_after:
+                    del self._last_seen[track_id]
+                    self.decided.pop(track_id, None)
+                    self._ballots.pop(track_id, None)
+                    self._rounds.pop(track_id, None)
+        return labels
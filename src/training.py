@@ -4,167 +4,365 @@ import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Dense, Flatten, Dropout
 from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.callbacks import ReduceLROnPlateau, EarlyStopping
-import matplotlib.pyplot as plt
-import cv2
-from pathlib import Path
-import json
-
-# --- Dataset creation logic (added here) ---
-def create_npz_dataset(data_dir='face_data', img_size=(92, 112), names_path='person_names.json'):
-    print("Creating dataset from collected face images...")
-    data_dir = Path(data_dir)
-    images, labels = [], []
-    label_map = {}  # Maps person ID to label index
-    current_label = 0
-
-    if not data_dir.exists():
-        print(f"No face data directory found at '{data_dir}'. Please collect face images first.")
-        return False
-
-    # Load existing person names
-    person_names = {}
-    if os.path.exists(names_path):
-        try:
-            with open(names_path, 'r') as f:
-                person_names = json.load(f)
-        except json.JSONDecodeError:
-            print(f"Warning: {names_path} is not valid JSON. Starting with empty dictionary.")
-
-    for person_dir in sorted(data_dir.glob("person*")):
-        if not person_dir.is_dir():
-            continue
-            
-        try:
-            # Extract numeric person ID from directory name
-            person_id = int(person_dir.name.replace("person", ""))
-            
-            # Create sequential label index for this person
-            if person_id not in label_map:
-                label_map[person_id] = current_label
-                current_label += 1
-            
-            label = label_map[person_id]
-            
-            # Process all face images for this person
-            for img_path in person_dir.glob("face*.jpg"):
-                img = cv2.imread(str(img_path), cv2.IMREAD_GRAYSCALE)
-                if img is not None:
-                    img = cv2.resize(img, img_size)
-                    images.append(img)
-                    labels.append(label)
-        except Exception as e:
-            print(f"Error processing {person_dir}: {e}")
-
-    if not images:
-        print("No images found. Please collect face data first.")
-        return False
-
-    X, y = np.array(images), np.array(labels)
-    indices = np.random.permutation(len(X))
-    split_idx = int(len(X) * 0.8)
-
-    trainX, trainY = X[indices[:split_idx]], y[indices[:split_idx]]
-    testX, testY = X[indices[split_idx:]], y[indices[split_idx:]]
-
-    np.savez('face_dataset.npz', 
-             trainX=trainX, trainY=trainY, 
-             testX=testX, testY=testY,
-             label_map=np.array(list(label_map.items())))
-
-    # Create a mapping from label indices to names for recognition
-    id_to_name = {}
-    for person_id, label_idx in label_map.items():
-        person_name = person_names.get(str(person_id), f"Person {person_id}")
-        id_to_name[str(label_idx)] = person_name
-    
-    print(f"Label map: {label_map}")
-    print(f"ID to name map: {id_to_name}")
-    
-    # Save the label-to-name mapping for the recognition phase
-    with open(names_path, 'w') as f:
-        json.dump(id_to_name, f)
-
-    print(f"Dataset created successfully!")
-    print(f"Training samples: {len(trainX)}")
-    print(f"Testing samples: {len(testX)}")
-    print(f"Classes: {len(label_map)}")
-    return True
+from tensorflow.keras.callbacks import ReduceLROnPlateau, EarlyStopping, Callback
+import dataset_store
+import math
+import time
+import zlib
+from metrics import registry
+
+TRAIN_STEP_SECONDS = registry.histogram('training_step_seconds', 'Training step time, including input wait')
+TRAIN_INPUT_WAIT_SECONDS = registry.histogram('training_input_wait_seconds',
+                                              'Time a training step waited for its batch')
+TRAIN_EPOCHS = registry.counter('training_epochs_total', 'Training epochs completed')
+
+# --- Dataset creation logic (shared with face_data_collection, see dataset_store) ---
+def create_npz_dataset(data_dir='face_data', img_size=(92, 112), names_path='person_names.json', workers=None):
+    """Create face_dataset.npz, decoding only images that are new or changed since the last run"""
+    return dataset_store.create_npz_dataset(data_dir, img_size, names_path, workers=workers) is not None
 
 
 # --- Your existing model and training code below ---
 
-def create_model(num_classes, input_shape=(112, 92, 1)):
-    tf.keras.mixed_precision.set_global_policy('mixed_float16')
+def select_precision(precision='auto'):
+    """Pick the Keras dtype policy for training on this machine.
+
+    'auto' uses mixed_float16 only when a GPU is visible; on CPU float16
+    math is emulated and slower than float32. 'bfloat16' selects
+    mixed_bfloat16, which recent CPUs with AVX512-BF16/AMX run natively.
+    """
+    if precision == 'auto':
+        return 'mixed_float16' if tf.config.list_physical_devices('GPU') else 'float32'
+    if precision in ('float16', 'mixed_float16'):
+        return 'mixed_float16'
+    if precision in ('bfloat16', 'mixed_bfloat16'):
+        return 'mixed_bfloat16'
+    if precision == 'float32':
+        return 'float32'
+    raise ValueError(f"Unknown precision '{precision}'")
+
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """Set TensorFlow's op thread pools (0 or None keeps TensorFlow's default).
+
+    The pools are process-wide and can only be sized before TensorFlow runs
+    its first op, so in a long-running server this only takes effect for the
+    first training job of the process.
+    """
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(int(intra_op_threads))
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(int(inter_op_threads))
+    except RuntimeError as e:
+        print(f"Warning: could not change thread settings, TensorFlow is already initialised ({e})")
+    print(f"Threads: intra-op={tf.config.threading.get_intra_op_parallelism_threads() or 'default'}, "
+          f"inter-op={tf.config.threading.get_inter_op_parallelism_threads() or 'default'}")
+
+
+def create_model(num_classes, input_shape=(112, 92, 1), precision='float32'):
+    # The dtype policy is passed to every layer instead of being set globally,
+    # so it never leaks into models loaded elsewhere in the process
+    policy = select_precision(precision)
 
     model = Sequential([
-        Conv2D(32, 3, activation='relu', input_shape=input_shape, padding='same'),
-        Conv2D(32, 3, activation='relu', padding='same'),
-        MaxPooling2D(2),
-
-        Conv2D(64, 3, activation='relu', padding='same'),
-        Conv2D(64, 3, activation='relu', padding='same'),
-        MaxPooling2D(2),
-
-        Conv2D(128, 3, activation='relu', padding='same'),
-        Conv2D(128, 3, activation='relu', padding='same'),
-        MaxPooling2D(2),
-
-        Flatten(),
-        Dense(512, activation='relu'),
-        Dropout(0.3),
-        Dense(256, activation='relu'),
-        Dropout(0.3),
-        Dense(num_classes, activation='softmax')
+        Conv2D(32, 3, activation='relu', input_shape=input_shape, padding='same', dtype=policy),
+        Conv2D(32, 3, activation='relu', padding='same', dtype=policy),
+        MaxPooling2D(2, dtype=policy),
+
+        Conv2D(64, 3, activation='relu', padding='same', dtype=policy),
+        Conv2D(64, 3, activation='relu', padding='same', dtype=policy),
+        MaxPooling2D(2, dtype=policy),
+
+        Conv2D(128, 3, activation='relu', padding='same', dtype=policy),
+        Conv2D(128, 3, activation='relu', padding='same', dtype=policy),
+        MaxPooling2D(2, dtype=policy),
+
+        Flatten(dtype=policy),
+        Dense(512, activation='relu', dtype=policy),
+        Dropout(0.3, dtype=policy),
+        Dense(256, activation='relu', dtype=policy),
+        Dropout(0.3, dtype=policy),
+        # Softmax stays in float32 for numerically stable probabilities
+        Dense(num_classes, activation='softmax', dtype='float32')
     ])
-    model.compile(optimizer=Adam(0.001), loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    optimizer = Adam(0.001)
+    if policy == 'mixed_float16':
+        # float16 gradients need loss scaling to avoid underflow
+        optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+    model.compile(optimizer=optimizer, loss='sparse_categorical_crossentropy', metrics=['accuracy'])
     return model
 
 
-def train_model(model_path='face_recognition_model.h5', dataset_path='face_dataset.npz', epochs=50, batch_size=32):
-    if not os.path.exists(dataset_path):
-        print(f"Dataset not found at {dataset_path}. Attempting to create dataset automatically...")
-        created = create_npz_dataset()
-        if not created:
-            print("Dataset creation failed. Cannot proceed with training.")
-            return None, 0
-
-    print(f"Loading dataset from {dataset_path}...")
-    data = np.load(dataset_path)
-    x_train, y_train = data['trainX'], data['trainY']
-    x_test, y_test = data['testX'], data['testY']
-
-    unique_classes = np.unique(y_train)
+class FaceBatches(tf.keras.utils.Sequence):
+    """Batches of uint8 face images, normalised to float only one batch at a time.
+
+    `images` may be an in-memory array or a memory-mapped ShardedImages view,
+    so the full dataset is never materialised as floats.
+    """
+
+    def __init__(self, images, labels, indices, batch_size=32, dtype='float32', shuffle=False):
+        super().__init__()
+        self.images = images
+        self.labels = labels
+        self.indices = np.array(indices)
+        self.batch_size = batch_size
+        self.dtype = dtype
+        self.shuffle = shuffle
+        if shuffle:
+            np.random.shuffle(self.indices)
+
+    def __len__(self):
+        return math.ceil(len(self.indices) / self.batch_size)
+
+    def __getitem__(self, i):
+        # Sorted reads keep memory-mapped access sequential
+        batch = np.sort(self.indices[i * self.batch_size:(i + 1) * self.batch_size])
+        x = self.images[batch].astype(self.dtype)
+        x *= 1.0 / 255.0
+        return x.reshape(x.shape + (1,)), self.labels[batch]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.indices)
+
+
+def augment_image(x):
+    """Cheap augmentation on a normalised HxWx1 face: flip, brightness, shift up to 4px"""
+    h, w = x.shape[0], x.shape[1]
+    x = tf.image.random_flip_left_right(x)
+    x = tf.clip_by_value(tf.image.random_brightness(x, 0.1), 0.0, 1.0)
+    x = tf.image.resize_with_crop_or_pad(x, h + 8, w + 8)
+    return tf.image.random_crop(x, [h, w, 1])
+
+
+def finish_tf_dataset(ds, count, batch_size, dtype='float32', training=False, augment=False, cache=True):
+    """uint8 (image, label) pairs -> cached, shuffled, normalised/augmented, prefetched batches"""
+    if cache:
+        # Cache the decoded uint8 images: a quarter of the size of float32
+        ds = ds.cache()
+    if training:
+        ds = ds.shuffle(min(count, 4096), reshuffle_each_iteration=True)
+
+    def preprocess(image, label):
+        x = tf.cast(image, tf.float32)[..., tf.newaxis] / 255.0
+        if augment and training:
+            x = augment_image(x)
+        return tf.cast(x, dtype), label
+
+    ds = ds.map(preprocess, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def array_tf_dataset(images, labels, indices, batch_size, **kwargs):
+    """Stream a split of a dataset file (in-memory or memory-mapped) through tf.data"""
+    h, w = images.shape[1:3]
+
+    def generate():
+        for start in range(0, len(indices), 256):
+            chunk = np.sort(indices[start:start + 256])
+            for image, label in zip(images[chunk], labels[chunk]):
+                yield image, int(label)
+
+    ds = tf.data.Dataset.from_generator(generate, output_signature=(
+        tf.TensorSpec((h, w), tf.uint8), tf.TensorSpec((), tf.int64)))
+    return finish_tf_dataset(ds, len(indices), batch_size, **kwargs)
+
+
+def image_file_tf_dataset(paths, labels, batch_size, img_size=(92, 112), **kwargs):
+    """Stream face JPEGs straight from disk, decoding them in parallel map calls"""
+    def load(path, label):
+        image = tf.io.decode_jpeg(tf.io.read_file(path), channels=1)
+        image = tf.image.resize(image, (img_size[1], img_size[0]))
+        return tf.cast(tf.round(image[..., 0]), tf.uint8), label
+
+    ds = tf.data.Dataset.from_tensor_slices((list(paths), np.asarray(labels, dtype=np.int64)))
+    ds = ds.map(load, num_parallel_calls=tf.data.AUTOTUNE)
+    return finish_tf_dataset(ds, len(paths), batch_size, **kwargs)
+
+
+class StepTimer(Callback):
+    """Report compute time per step and the time spent waiting for the next batch"""
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.compute, self.waiting, self.steps = 0.0, 0.0, 0
+        self.batch_start = self.last_end = time.perf_counter()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.batch_start = time.perf_counter()
+        self.wait = self.batch_start - self.last_end
+        self.waiting += self.wait
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.last_end = time.perf_counter()
+        self.compute += self.last_end - self.batch_start
+        self.steps += 1
+        TRAIN_STEP_SECONDS.observe(self.wait + self.last_end - self.batch_start)
+        TRAIN_INPUT_WAIT_SECONDS.observe(self.wait)
+
+    def on_epoch_end(self, epoch, logs=None):
+        TRAIN_EPOCHS.inc()
+        if self.steps:
+            total = self.compute + self.waiting
+            print(f"[STEP TIME] epoch {epoch + 1}: {1000 * total / self.steps:.1f} ms/step "
+                  f"({1000 * self.compute / self.steps:.1f} ms compute, "
+                  f"{1000 * self.waiting / self.steps:.1f} ms waiting for input, "
+                  f"{self.steps / total:.2f} steps/s)")
+
+
+class JobProgress(Callback):
+    """Report epochs to a job_manager.Job and stop training once the job is cancelled"""
+
+    def __init__(self, job, epochs):
+        super().__init__()
+        self.job = job
+        self.epochs = epochs
+        self.cancelled = False
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.job.update(epoch=epoch + 1, epochs=self.epochs)
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self.job.cancelled():
+            self.cancelled = True
+            self.model.stop_training = True
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        self.job.update((epoch + 1) / self.epochs,
+                        loss=round(float(logs.get('loss', 0.0)), 4),
+                        valAccuracy=round(float(logs.get('val_accuracy', 0.0)), 4))
+
+
+def build_inputs(dataset_path, batch_size, input_dtype='float32', input_pipeline='sequence',
+                 augment=False, data_dir='face_data', dedup_threshold=None):
+    """Create (train, validation, test, num_classes, train_count) for model.fit.
+
+    input_pipeline is 'sequence' (FaceBatches over the dataset file),
+    'tfdata' (tf.data over the dataset file) or 'tfdata-images' (tf.data
+    decoding face_data/person*/face*.jpg directly, no dataset file needed).
+    A missing dataset file is built first. With `dedup_threshold` the dataset
+    is always (re)built from `data_dir`, dropping near-duplicate images (see
+    dataset_store.create_npz_dataset); 'tfdata-images' has no dataset to
+    deduplicate and ignores it.
+    Returns None when the data is missing or has fewer than two classes.
+    """
+    if input_pipeline == 'tfdata-images':
+        if dedup_threshold is not None:
+            print("Warning: dedup_threshold has no effect with the tfdata-images pipeline")
+        people = dataset_store.scan_face_data(data_dir)
+        paths, labels = [], []
+        for label, (_, person_paths) in enumerate(people.values()):
+            paths.extend(person_paths)
+            labels.extend([label] * len(person_paths))
+        labels = np.asarray(labels, dtype=np.int64)
+        if len(paths) == 0:
+            print("No images found. Please collect face data first.")
+            return None
+        # Same label order as create_npz_dataset, so recognition can name this model's outputs
+        dataset_store.write_label_names({person_id: label for label, person_id in enumerate(people)})
+        # Stable 80/20 split by file name hash, so the test set never changes between runs
+        in_test = np.array([zlib.crc32(p.encode()) % 5 == 0 for p in paths], dtype=bool)
+        train_idx, test_idx = np.flatnonzero(~in_test), np.flatnonzero(in_test)
+        np.random.shuffle(train_idx)
+        num_classes = len(people)
+    else:
+        if not os.path.exists(dataset_path) or dedup_threshold is not None:
+            if dedup_threshold is not None:
+                print(f"Rebuilding {dataset_path} without near-duplicates (threshold {dedup_threshold} bits)...")
+            else:
+                print(f"Dataset not found at {dataset_path}. Attempting to create dataset automatically...")
+            created = dataset_store.create_npz_dataset(data_dir, dataset_path=dataset_path,
+                                                       dedup_threshold=dedup_threshold)
+            if not created:
+                print("Dataset creation failed. Cannot proceed with training.")
+                return None
+
+        print(f"Loading dataset from {dataset_path}...")
+        dataset = dataset_store.open_dataset(dataset_path)
+        images, labels, train_idx = dataset.split('train')
+        _, _, test_idx = dataset.split('test')
+        # Size the output layer from the label map so every label index is valid
+        num_classes = max(len(dataset.label_map), int(labels.max()) + 1)
+
+    unique_classes = np.unique(labels[train_idx])
     if len(unique_classes) < 2:
         print(f"Not enough classes for training. Found only {len(unique_classes)} class(es). Need at least 2.")
-        return None, 0
+        return None
+
+    # Hold out the last 20% of the training split, like validation_split=0.2 did
+    val_count = int(len(train_idx) * 0.2)
+    fit_idx, val_idx = train_idx[:len(train_idx) - val_count], train_idx[len(train_idx) - val_count:]
+    splits = ((fit_idx, True), (val_idx, False), (test_idx, False))
+
+    if input_pipeline == 'sequence':
+        if augment:
+            print("Note: augmentation is only applied by the tf.data input pipelines")
+        inputs = [FaceBatches(images, labels, idx, batch_size, input_dtype, shuffle=training)
+                  for idx, training in splits]
+    elif input_pipeline == 'tfdata':
+        inputs = [array_tf_dataset(images, labels, idx, batch_size, dtype=input_dtype,
+                                   training=training, augment=augment)
+                  for idx, training in splits]
+    elif input_pipeline == 'tfdata-images':
+        inputs = [image_file_tf_dataset([paths[i] for i in idx], labels[idx], batch_size, dtype=input_dtype,
+                                        training=training, augment=augment)
+                  for idx, training in splits]
+    else:
+        raise ValueError(f"Unknown input pipeline '{input_pipeline}'")
 
-    x_train, x_test = x_train / 255.0, x_test / 255.0
-    x_train = x_train.reshape(-1, 112, 92, 1)
-    x_test = x_test.reshape(-1, 112, 92, 1)
+    return inputs[0], inputs[1], inputs[2], num_classes, len(train_idx)
 
-    print(f"Training data shape: {x_train.shape} with {len(unique_classes)} classes")
-    model = create_model(len(unique_classes))
+
+def train_model(model_path='face_recognition_model.h5', dataset_path='face_dataset.npz', epochs=50, batch_size=32,
+                input_dtype='float32', input_pipeline='sequence', augment=False, data_dir='face_data',
+                precision='auto', intra_op_threads=None, inter_op_threads=None,
+                tflite_path=None, quantize=None, job=None, dedup_threshold=None):
+    configure_threads(intra_op_threads, inter_op_threads)
+    inputs = build_inputs(dataset_path, batch_size, input_dtype, input_pipeline, augment, data_dir,
+                          dedup_threshold)
+    if inputs is None:
+        return None, 0
+    train_data, val_data, test_data, num_classes, train_count = inputs
+
+    print(f"Training data shape: {(train_count, 112, 92, 1)} with {num_classes} classes "
+          f"(input pipeline: {input_pipeline})")
+    print(f"Precision policy: {select_precision(precision)}")
+    model = create_model(num_classes, precision=precision)
 
     model.summary()
 
     reduce_lr = ReduceLROnPlateau(monitor='val_loss', factor=0.2, patience=5, min_lr=1e-6)
     early_stop = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)
 
+    callbacks = [reduce_lr, early_stop, StepTimer()]
+    progress = JobProgress(job, epochs) if job is not None else None
+    if progress is not None:
+        callbacks.append(progress)
+
     print(f"Starting training for {epochs} epochs...")
     try:
         history = model.fit(
-            x_train, y_train,
-            validation_split=0.2,
-            batch_size=batch_size,
+            train_data,
+            validation_data=val_data,
             epochs=epochs,
-            callbacks=[reduce_lr, early_stop],
+            callbacks=callbacks,
             verbose=1
         )
 
+        if progress is not None and progress.cancelled:
+            # Keep the previous model file rather than a half-trained one
+            print("Training cancelled, model not saved")
+            return None, 0
+
         model.save(model_path)
         print(f"Model saved to {model_path}")
 
+        # Imported here so importing training (e.g. from server.py) stays cheap
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
         fig, axs = plt.subplots(1, 2, figsize=(12, 4))
         axs[0].plot(history.history['accuracy'], label='Train')
         axs[0].plot(history.history['val_accuracy'], label='Val')
@@ -179,18 +377,31 @@ def train_model(model_path='face_recognition_model.h5', dataset_path='face_datas
         final_val_acc = history.history['val_accuracy'][-1]
         plt.tight_layout()
         plt.savefig('training_history.png')
+        plt.close(fig)
         print(f"Training complete! Final validation accuracy: {final_val_acc:.4f}")
         print(f"Training history plot saved to training_history.png")
 
-        test_loss, test_acc = model.evaluate(x_test, y_test, verbose=0)
+        test_loss, test_acc = model.evaluate(test_data, verbose=0)
         print(f"Test accuracy: {test_acc:.4f}")
 
-        return model, final_val_acc
-
     except Exception as e:
         print(f"Error during training: {str(e)}")
         return None, 0
 
+    # The model is saved by now; a failed export must not be reported as a failed training
+    if tflite_path:
+        try:
+            from model_export import export_model
+            export_model(model_path, tflite_path, quantize, dataset_path, model=model)
+            if job is not None:
+                job.update(tflitePath=str(tflite_path))
+        except Exception as e:
+            print(f"Error exporting TFLite model to {tflite_path}: {str(e)}")
+            if job is not None:
+                job.update(exportError=str(e))
+
+    return model, final_val_acc
+
 
 def main():
     import argparse
@@ -198,11 +409,30 @@ def main():
     parser.add_argument('--model', dest='model_path', default='face_recognition_model.h5',
                         help='Path to save model (default: face_recognition_model.h5)')
     parser.add_argument('--dataset', dest='dataset_path', default='face_dataset.npz',
-                        help='Path to dataset (default: face_dataset.npz)')
+                        help='Path to dataset: .npz file or sharded dataset directory (default: face_dataset.npz)')
     parser.add_argument('--epochs', type=int, default=50,
                         help='Number of training epochs (default: 50)')
     parser.add_argument('--batch-size', type=int, default=32,
                         help='Batch size for training (default: 32)')
+    parser.add_argument('--input-pipeline', dest='input_pipeline', default='sequence',
+                        choices=['sequence', 'tfdata', 'tfdata-images'],
+                        help='How training batches are produced (default: sequence)')
+    parser.add_argument('--augment', action='store_true',
+                        help='Random flip/brightness/shift augmentation (tf.data pipelines only)')
+    parser.add_argument('--precision', default='auto', choices=['auto', 'float32', 'bfloat16', 'float16'],
+                        help='auto = mixed_float16 on GPU, float32 on CPU (default: auto)')
+    parser.add_argument('--intra-op-threads', dest='intra_op_threads', type=int, default=0,
+                        help='Threads used inside a single op (default: TensorFlow default)')
+    parser.add_argument('--inter-op-threads', dest='inter_op_threads', type=int, default=0,
+                        help='Ops run in parallel (default: TensorFlow default)')
+    parser.add_argument('--export-tflite', dest='tflite_path',
+                        help='Also export the trained model to this .tflite path')
+    parser.add_argument('--quantize', choices=['none', 'float16', 'int8'], default='none',
+                        help='Post-training quantization of the TFLite export (default: none)')
+    parser.add_argument('--dedup-threshold', dest='dedup_threshold', type=int, default=None,
+                        help='Rebuild the dataset first, dropping images within this many perceptual-hash '
+                             f'bits of another image of the same person, e.g. {dataset_store.DEDUP_THRESHOLD} '
+                             '(default: use the dataset as is)')
     parser.add_argument('--interactive', action='store_true',
                         help='Run in interactive mode with prompts')
 
@@ -228,7 +458,12 @@ def main():
     print(f"- Epochs: {epochs}")
     print(f"- Batch size: {batch_size}")
 
-    train_model(model_path, dataset_path, epochs, batch_size)
+    print(f"- Input pipeline: {args.input_pipeline}{' with augmentation' if args.augment else ''}")
+
+    train_model(model_path, dataset_path, epochs, batch_size,
+                input_pipeline=args.input_pipeline, augment=args.augment, precision=args.precision,
+                intra_op_threads=args.intra_op_threads, inter_op_threads=args.inter_op_threads,
+                tflite_path=args.tflite_path, quantize=args.quantize, dedup_threshold=args.dedup_threshold)
 
 
 if __name__ == "__main__":